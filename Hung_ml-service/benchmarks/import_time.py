@@ -0,0 +1,83 @@
+"""
+Benchmark: import time of the app, for all routers and for router subsets
+
+Imports `app` in a fresh interpreter under `python -X importtime` once per
+scenario and reports the total import time, the packages it is spent in and
+which heavy ML libraries got loaded:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --routers revenue_prediction product_association,models
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+
+# Libraries the services import on first use rather than at import time
+# (pandas itself imports pyarrow when it is installed)
+HEAVY_PACKAGES = ("sklearn", "scipy", "mlxtend", "joblib", "pyarrow", "PIL")
+
+def import_profile(routers: str) -> dict:
+    """Import app once with -X importtime; self time per module in microseconds"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([SRC_DIR, ROOT_DIR]), ML_ENABLED_ROUTERS=routers)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=SRC_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(self_us)
+    return modules
+
+def report(label: str, routers: str, repeat: int, top: int):
+    # The fastest run is the least disturbed by the rest of the machine
+    runs = [import_profile(routers) for _ in range(repeat)]
+    modules = min(runs, key=lambda m: sum(m.values()))
+
+    by_package = defaultdict(int)
+    for name, self_us in modules.items():
+        by_package[name.split(".")[0]] += self_us
+
+    loaded = [package for package in HEAVY_PACKAGES if package in by_package]
+    print(f"\n{label}")
+    print(f"  total import time: {sum(modules.values()) / 1000:.0f} ms ({len(modules)} modules)")
+    print(f"  heavy libraries loaded: {', '.join(loaded) or 'none'}")
+    print(f"  {'package':<24} {'ms':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<24} {self_us / 1000:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routers", nargs="*", default=None,
+                        help="ML_ENABLED_ROUTERS values to compare (default: all, then each router alone)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    sys.path.insert(0, SRC_DIR)
+    sys.path.insert(0, ROOT_DIR)
+    from app import API_ROUTERS
+
+    scenarios = args.routers if args.routers is not None else [""] + list(API_ROUTERS)
+
+    # Compile .pyc files first so no scenario pays for it
+    import_profile("")
+
+    for routers in scenarios:
+        report(routers or "all routers", routers, args.repeat, args.top)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,104 @@
+"""
+Benchmark: per-worker memory of copied vs memory-mapped model loading
+
+Starts several worker processes (like `uvicorn --workers N`) that load the
+same model files through ModelLoader, with and without mmap, and reports
+each worker's RSS and PSS (Linux; PSS splits shared pages between the
+processes mapping them):
+
+    python benchmarks/model_mmap.py --workers 4 --size-mb 200
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.append(SRC_DIR)
+
+from utils.model_loader import ModelLoader
+
+def memory_kb() -> dict:
+    """VmRSS / RssAnon / RssFile from /proc/self/status and Pss from smaps_rollup"""
+    result = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                result[key] = int(value.split()[0])
+    if os.path.exists("/proc/self/smaps_rollup"):
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    result["Pss"] = int(line.split()[1])
+    return result
+
+def touch(value) -> float:
+    """Read every array in a model so all of its pages are resident"""
+    if isinstance(value, np.ndarray):
+        return float(value.sum()) if value.dtype.kind in "iuf" else float(value.size)
+    if isinstance(value, dict):
+        return sum(touch(v) for v in value.values())
+    return 0.0
+
+def worker(models_dir: str, mmap: bool, barrier, results):
+    loader = ModelLoader(models_dir, mmap=mmap)
+    touch(loader.load_arrays("bench_rules"))
+    touch(loader.load_model("bench_model"))
+    # Measure while every worker holds its models
+    barrier.wait()
+    results.put(memory_kb())
+    barrier.wait()
+
+def build_models(models_dir: str, size_mb: int):
+    """An Apriori-style .npz and a joblib pickle, half of size_mb each"""
+    rng = np.random.default_rng(0)
+    n = size_mb * 1024 * 1024 // 2 // 8
+    loader = ModelLoader(models_dir)
+    loader.save_arrays({
+        "offsets": np.arange(n // 2, dtype=np.int64),
+        "items": rng.integers(0, 5000, n // 2, dtype=np.int32),
+        "support": rng.random(n // 4, dtype=np.float32),
+        "confidence": rng.random(n // 4, dtype=np.float32),
+        "min_support": np.float64(0.01),
+    }, "bench_rules")
+    loader.save_model({"centers": rng.random((n // 1000, 1000)), "labels": {0: "A", 1: "B"}}, "bench_model")
+
+def run(models_dir: str, workers: int, mmap: bool) -> list:
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(models_dir, mmap, barrier, results)) for _ in range(workers)]
+    for p in processes:
+        p.start()
+    stats = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--size-mb", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Building models (~{args.size_mb} MB)...")
+        build_models(tmp, args.size_mb)
+
+        for mmap in (False, True):
+            stats = run(tmp, args.workers, mmap)
+            print(f"\n{'mmap' if mmap else 'copy'} ({args.workers} workers)")
+            print(f"  {'worker':>6} {'RSS MB':>8} {'anon MB':>8} {'file MB':>8} {'PSS MB':>8}")
+            for i, s in enumerate(stats):
+                print(f"  {i:>6} {s['VmRSS'] / 1024:>8.1f} {s.get('RssAnon', 0) / 1024:>8.1f} "
+                      f"{s.get('RssFile', 0) / 1024:>8.1f} {s.get('Pss', 0) / 1024:>8.1f}")
+            print(f"  total PSS: {sum(s.get('Pss', 0) for s in stats) / 1024:.1f} MB")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
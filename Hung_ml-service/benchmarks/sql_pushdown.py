@@ -0,0 +1,118 @@
+"""
+Benchmark: RFM and rolling revenue features in pandas vs SQL aggregates / daily series
+
+Runs against a synthetic SQLite database (utils/sqlite_database.py), so no
+SQL Server is needed:
+
+    python benchmarks/sql_pushdown.py --orders 200000 --customers 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from utils.sqlite_database import SQLiteDatabase
+from services.decision_tree_service import DecisionTreeService, CustomerClassificationService
+
+def build_database(path: str, n_orders: int, n_customers: int, seed: int = 42) -> SQLiteDatabase:
+    """Synthetic shop: customers, products and delivered orders over two years"""
+    rnd = random.Random(seed)
+    database = SQLiteDatabase(path)
+    database.create_schema()
+
+    start = datetime.now() - timedelta(days=730)
+    users = [(i, 'customer') for i in range(1, n_customers + 1)]
+    products = [(i, f"SP{i}", None, 10000.0 * (1 + i % 50), 0, 100, 1, "[]", "cái", 'active') for i in range(1, 501)]
+    orders, items = [], []
+    for order_id in range(1, n_orders + 1):
+        created_at = start + timedelta(minutes=rnd.randint(0, 730 * 24 * 60))
+        total = float(rnd.randint(20, 2000) * 1000)
+        status = 'delivered' if rnd.random() < 0.9 else 'cancelled'
+        orders.append((order_id, rnd.randint(1, n_customers), total, total, 0.0, 0.0, 'COD', status,
+                       created_at.strftime("%Y-%m-%d %H:%M:%S")))
+        for _ in range(rnd.randint(1, 5)):
+            items.append((order_id, rnd.randint(1, 500), rnd.randint(1, 3)))
+
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO Users (id, role) VALUES (%s, %s)", users)
+        cursor.executemany("INSERT INTO Categories (id, name) VALUES (%s, %s)", [(1, "Thuc pham")])
+        cursor.executemany(
+            "INSERT INTO Products (id, name, description, price, discount_percent, stock, category_id, images, unit, status) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", products
+        )
+        cursor.executemany(
+            "INSERT INTO Orders (id, user_id, total, subtotal, discount, shipping_fee, payment_method, order_status, created_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)", orders
+        )
+        cursor.executemany("INSERT INTO OrderItems (order_id, product_id, quantity) VALUES (%s, %s, %s)", items)
+        conn.commit()
+    return database
+
+def calendar_rolling_averages(orders: pd.DataFrame):
+    """Average order value over the 7 / 30 days before each order's day, with pandas time windows"""
+    df = orders.assign(day=pd.to_datetime(orders['created_at']).dt.floor('D')).sort_values('day', kind='stable')
+    totals = df.set_index('day')['total'].astype(float)
+    default = totals.mean()
+    averages = {}
+    for size in (30, 7):
+        window = totals.rolling(f"{size}D", closed='left')
+        averages[size] = (window.sum() / window.count()).to_numpy()
+    avg_30d = np.where(np.isnan(averages[30]), default, averages[30])
+    avg_7d = np.where(np.isnan(averages[7]), avg_30d, averages[7])
+    return avg_7d, avg_30d
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--customers", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Building SQLite database ({args.orders} orders, {args.customers} customers)...")
+        database = build_database(os.path.join(tmp, "bench.db"), args.orders, args.customers)
+
+        revenue = DecisionTreeService()
+        customers = CustomerClassificationService()
+
+        # Revenue features: pandas time-based rolling per order vs daily cumulative sums
+        orders = database.get_order_features_columns().to_frame()
+        pandas_avg, pandas_s = timed(lambda: calendar_rolling_averages(orders))
+        sql_df, sql_s = timed(lambda: revenue.prepare_data(orders.copy()))
+        for column, expected in zip(('avg_order_7d', 'avg_order_30d'), pandas_avg):
+            assert np.allclose(sql_df[column].to_numpy(), expected)
+        print(f"\nRevenue features ({len(sql_df)} orders)")
+        print(f"  pandas rolling : {pandas_s:.3f}s")
+        print(f"  daily series   : {sql_s:.3f}s")
+
+        # RFM: per-customer aggregates + pandas apply vs SQL CASE buckets
+        pandas_rfm, pandas_s = timed(lambda: customers.prepare_data(database.get_customers_columns().to_frame()))
+        sql_rfm, sql_s = timed(lambda: customers.prepare_data(database.get_customer_rfm_columns().to_frame()))
+        merged = pandas_rfm.merge(sql_rfm, on='user_id', suffixes=('_pandas', '_sql'))
+        assert len(merged) == len(sql_rfm) and (merged['rfm_score_pandas'] == merged['rfm_score_sql']).all()
+        print(f"\nRFM scores ({len(sql_rfm)} customers)")
+        print(f"  pandas apply   : {pandas_s:.3f}s")
+        print(f"  SQL CASE       : {sql_s:.3f}s")
+
+        daily, daily_s = timed(lambda: database.get_daily_revenue_columns().to_frame())
+        print(f"\nDaily revenue series ({len(daily)} days): {daily_s:.3f}s")
+
+        database.close()
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -25,7 +25,7 @@ class TrainRequest(BaseModel):
     retrain: bool = False
 
 @router.post("/customer-segmentation/train")
-async def train_segmentation_model(request: TrainRequest):
+def train_segmentation_model(request: TrainRequest):
     """
     Train customer segmentation model (Decision Tree)
     """
@@ -62,7 +62,7 @@ async def get_all_segments():
     Get all customer segments (Decision Tree)
     """
     try:
-        result = customer_classification_service.segment_all_customers()
+        result = await customer_classification_service.segment_all_customers_async()
         
         if not result['success']:
             raise HTTPException(status_code=400, detail=result['message'])
@@ -27,7 +27,7 @@ class ClassifyURLRequest(BaseModel):
     image_url: str
 
 @router.post("/image-classification/train")
-async def train_image_model(request: TrainRequest):
+def train_image_model(request: TrainRequest):
     """
     Train image classification model
     
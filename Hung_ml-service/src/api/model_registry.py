@@ -0,0 +1,92 @@
+"""
+Model Registry API Endpoints (versions and rollback)
+"""
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from utils.model_loader import model_loader
+
+router = APIRouter()
+
+class RollbackRequest(BaseModel):
+    """Rollback request"""
+    version: Optional[str] = None
+
+def _require_model(model_name: str):
+    """404 unless model_name is a saved model (also rejects names like '..')"""
+    if model_name not in model_loader.list_models():
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy model: {model_name}")
+
+@router.get("/models")
+async def list_models():
+    """List saved models with their current version"""
+    try:
+        models = [
+            {
+                "model_name": name,
+                "current_version": model_loader.current_version(name),
+                "n_versions": len(model_loader.versions(name))
+            }
+            for name in model_loader.list_models()
+        ]
+
+        return {
+            "success": True,
+            "models": models,
+            "registry": model_loader.cache_stats()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/models/{model_name}/versions")
+async def get_model_versions(model_name: str):
+    """List the saved versions of a model, oldest first"""
+    try:
+        _require_model(model_name)
+        versions = model_loader.versions(model_name)
+
+        if not versions:
+            raise HTTPException(status_code=404, detail="Model không có phiên bản nào")
+
+        return {
+            "success": True,
+            "model_name": model_name,
+            "versions": versions
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/models/{model_name}/rollback")
+async def rollback_model(model_name: str, request: RollbackRequest):
+    """
+    Switch a model back to an earlier version
+
+    - **version**: Version to switch to (default: the one before the current)
+
+    Services pick the version up on their next request.
+    """
+    try:
+        _require_model(model_name)
+        version = model_loader.rollback(model_name, request.version)
+
+        if version is None:
+            raise HTTPException(status_code=400, detail="Không có phiên bản để rollback")
+
+        return {
+            "success": True,
+            "model_name": model_name,
+            "current_version": version,
+            "message": f"Đã chuyển model về phiên bản {version}"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -4,7 +4,7 @@ Product Association API Endpoints
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import sys
 import os
 
@@ -19,32 +19,61 @@ class TrainRequest(BaseModel):
     retrain: bool = False
     min_support: float = 0.01
     min_confidence: float = 0.3
+    engine: str = "apriori"
+    incremental: bool = False
+    n_workers: int = 1
+    window_days: Optional[int] = None
+    half_life_days: Optional[float] = None
+    measure_memory: bool = False
 
 class RecommendationRequest(BaseModel):
     """Recommendation request"""
     product_names: List[str]
     top_n: int = 5
 
+class BatchRecommendationRequest(BaseModel):
+    """Batch recommendation request"""
+    carts: List[List[str]]
+    top_n: int = 5
+
 @router.post("/product-association/train")
-async def train_association_model(request: TrainRequest):
+def train_association_model(request: TrainRequest):
     """
     Train product association model using Apriori algorithm
     
     - **retrain**: Force retrain even if model exists
     - **min_support**: Minimum support threshold (default: 0.01)
     - **min_confidence**: Minimum confidence threshold (default: 0.3)
+    - **engine**: Mining engine: apriori, fpgrowth or eclat (default: apriori)
+    - **incremental**: Only add orders delivered since the last run
+    - **n_workers**: Worker processes for parallel mining (default: 1)
+    - **window_days**: Only mine orders from the last N days
+    - **half_life_days**: Weight orders by recency with this half-life (uses ECLAT)
+    - **measure_memory**: Also report the mining peak memory (slower; for comparing engines)
+    
+    Each window is cached as its own model, so calling this with retrain=false
+    and another window switches the served rules without re-mining. The
+    served model only changes once training (or loading) succeeded.
     """
     try:
-        # Update thresholds
-        apriori_service.min_support = request.min_support
-        apriori_service.min_confidence = request.min_confidence
-        
-        result = apriori_service.train(retrain=request.retrain)
+        result = apriori_service.train_and_activate(
+            retrain=request.retrain,
+            incremental=request.incremental,
+            measure_memory=request.measure_memory,
+            min_support=request.min_support,
+            min_confidence=request.min_confidence,
+            engine=request.engine,
+            n_workers=request.n_workers,
+            window_days=request.window_days,
+            half_life_days=request.half_life_days
+        )
         
         if not result['success']:
             raise HTTPException(status_code=400, detail=result['message'])
         
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -69,15 +98,37 @@ async def get_product_recommendations(request: RecommendationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/product-association/recommendations/batch")
+async def get_batch_product_recommendations(request: BatchRecommendationRequest):
+    """
+    Get product recommendations for many carts in one call
+    
+    - **carts**: List of carts, each a list of product names
+    - **top_n**: Number of recommendations per cart (default: 5)
+    """
+    try:
+        result = apriori_service.get_batch_recommendations(
+            carts=request.carts,
+            top_n=request.top_n
+        )
+        
+        if not result['success']:
+            raise HTTPException(status_code=400, detail=result['message'])
+        
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/product-association/rules")
-async def get_association_rules(top_n: int = 10):
+async def get_association_rules(top_n: int = 10, offset: int = 0):
     """
-    Get top association rules
+    Get top association rules (sorted by lift)
     
     - **top_n**: Number of top rules to return (default: 10)
+    - **offset**: Number of rules to skip, for paging (default: 0)
     """
     try:
-        result = apriori_service.get_top_rules(top_n=top_n)
+        result = apriori_service.get_top_rules(top_n=top_n, offset=offset)
         
         if not result['success']:
             raise HTTPException(status_code=400, detail=result['message'])
@@ -87,17 +138,19 @@ async def get_association_rules(top_n: int = 10):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/product-association/frequent-itemsets")
-async def get_frequent_itemsets(min_length: int = 2, top_n: int = 20):
+async def get_frequent_itemsets(min_length: int = 2, top_n: int = 20, offset: int = 0):
     """
-    Get frequent itemsets
+    Get frequent itemsets (sorted by support)
     
     - **min_length**: Minimum itemset length (default: 2)
     - **top_n**: Number of itemsets to return (default: 20)
+    - **offset**: Number of itemsets to skip, for paging (default: 0)
     """
     try:
         result = apriori_service.get_frequent_itemsets(
             min_length=min_length,
-            top_n=top_n
+            top_n=top_n,
+            offset=offset
         )
         
         if not result['success']:
@@ -111,14 +164,15 @@ async def get_frequent_itemsets(min_length: int = 2, top_n: int = 20):
 async def get_model_status():
     """Get model training status"""
     try:
-        from utils.model_loader import model_loader, MODEL_APRIORI
+        from utils.model_loader import model_loader
         
-        model_exists = model_loader.model_exists(MODEL_APRIORI)
+        model_name = apriori_service.active_model_name
+        model_exists = model_loader.model_exists(model_name)
         
         return {
             "success": True,
             "model_trained": model_exists,
-            "model_name": MODEL_APRIORI,
+            "model_name": model_name,
             "message": "Model đã được training" if model_exists else "Model chưa được training"
         }
     except Exception as e:
@@ -23,7 +23,7 @@ class ClassifyRequest(BaseModel):
     text: str
 
 @router.post("/product-classifier/train")
-async def train_classifier_model(request: TrainRequest):
+def train_classifier_model(request: TrainRequest):
     """
     Train product text classifier (K-Means)
     
@@ -63,7 +63,7 @@ async def classify_product(request: ClassifyRequest):
 async def get_product_clusters():
     """Get all product clusters (K-Means)"""
     try:
-        result = kmeans_service.get_all_clusters()
+        result = await kmeans_service.get_all_clusters_async()
         if not result['success']:
              raise HTTPException(status_code=400, detail=result['message'])
         return result
@@ -4,7 +4,7 @@ Revenue Prediction API Endpoints
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List
 from datetime import datetime
 import sys
 import os
@@ -24,12 +24,24 @@ class PredictRequest(BaseModel):
     date: str  # YYYY-MM-DD format
     items_count: int = 3
 
+class BatchPredictRequest(BaseModel):
+    """Batch revenue prediction request"""
+    dates: List[str]  # YYYY-MM-DD format
+    items_counts: List[int] = [3]
+    grid: bool = True  # every date x every items_count; False pairs them by position
+
 class ForecastRequest(BaseModel):
     """Forecast request"""
     days: int = 7
 
+class ForecastRangeRequest(BaseModel):
+    """Forecast request for a date range"""
+    start_date: str  # YYYY-MM-DD format
+    end_date: str  # YYYY-MM-DD format
+    items_count: int = 3
+
 @router.post("/revenue-prediction/train")
-async def train_revenue_model(request: TrainRequest):
+def train_revenue_model(request: TrainRequest):
     """
     Train revenue prediction model
     
@@ -71,6 +83,37 @@ async def predict_revenue(request: PredictRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/revenue-prediction/predict-batch")
+async def predict_revenue_batch(request: BatchPredictRequest):
+    """
+    Predict revenue for many dates and basket-size scenarios in one call
+    
+    - **dates**: Dates in YYYY-MM-DD format
+    - **items_counts**: Expected numbers of items per order (default: [3])
+    - **grid**: Predict every date with every items_count (default); when false,
+      dates and items_counts are paired by position
+    """
+    try:
+        try:
+            dates = [datetime.strptime(date, "%Y-%m-%d") for date in request.dates]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+        
+        result = decision_tree_service.predict_batch(
+            dates=dates,
+            items_counts=request.items_counts,
+            grid=request.grid
+        )
+        
+        if not result['success']:
+            raise HTTPException(status_code=400, detail=result['message'])
+        
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/revenue-prediction/forecast")
 async def forecast_revenue(request: ForecastRequest):
     """
@@ -91,6 +134,59 @@ async def forecast_revenue(request: ForecastRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/revenue-prediction/forecast-range")
+async def forecast_revenue_range(request: ForecastRangeRequest):
+    """
+    Forecast revenue for every day of a date range
+    
+    - **start_date**: First day in YYYY-MM-DD format
+    - **end_date**: Last day in YYYY-MM-DD format (inclusive, at most 366 days after start_date)
+    - **items_count**: Expected number of items per order
+    """
+    try:
+        try:
+            start_date = datetime.strptime(request.start_date, "%Y-%m-%d")
+            end_date = datetime.strptime(request.end_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+        
+        result = decision_tree_service.predict_range(
+            start_date=start_date,
+            end_date=end_date,
+            items_count=request.items_count
+        )
+        
+        if not result['success']:
+            raise HTTPException(status_code=400, detail=result['message'])
+        
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/revenue-prediction/history")
+async def get_revenue_history(days: int = 30):
+    """
+    Daily revenue with 7/30-day moving averages
+    
+    - **days**: Number of most recent days to return (default: 30)
+    """
+    try:
+        if days < 1 or days > 365:
+            raise HTTPException(status_code=400, detail="Days must be between 1 and 365")
+        
+        result = await decision_tree_service.get_revenue_history_async(days=days)
+        
+        if not result['success']:
+            raise HTTPException(status_code=400, detail=result['message'])
+        
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/revenue-prediction/status")
 async def get_model_status():
     """Get model training status"""
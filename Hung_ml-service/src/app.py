@@ -5,26 +5,61 @@ FastAPI application for machine learning services
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
+import importlib
 import uvicorn
+import sys
 import os
 from dotenv import load_dotenv
 
-# Import API routers
-from src.api import customer_segmentation, revenue_prediction, product_association
-from src.api import product_classifier, image_classification
+# Service modules (services, utils) are imported from src, as in the routers,
+# so this must not depend on which routers are enabled
+sys.path.append(os.path.dirname(__file__))
 
 # Load environment variables
 load_dotenv()
 
+# API routers: name -> (module, path, tag). Routers are imported only when
+# enabled, so a deployment serving a subset never loads the other services'
+# libraries.
+API_ROUTERS = {
+    "customer_segmentation": ("src.api.customer_segmentation", "/api/ml/customer-segmentation", "Customer Segmentation"),
+    "revenue_prediction": ("src.api.revenue_prediction", "/api/ml/revenue-prediction", "Revenue Prediction"),
+    "product_association": ("src.api.product_association", "/api/ml/product-association", "Product Association"),
+    "product_classifier": ("src.api.product_classifier", "/api/ml/product-classifier", "Product Classifier"),
+    "image_classification": ("src.api.image_classification", "/api/ml/image-classification", "Image Classification"),
+    "models": ("src.api.model_registry", "/api/ml/models", "Models"),
+}
+
+def enabled_routers() -> list:
+    """Routers named in ML_ENABLED_ROUTERS (comma-separated, default: all)"""
+    names = [name.strip() for name in os.getenv("ML_ENABLED_ROUTERS", "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in API_ROUTERS]
+    if unknown:
+        print(f"⚠️  Router không tồn tại: {', '.join(unknown)}")
+    return [name for name in API_ROUTERS if name in names] if names else list(API_ROUTERS)
+
+ENABLED_ROUTERS = enabled_routers()
+
 # App lifespan
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handle startup and shutdown events"""
     print("🚀 ML Service khởi động...")
     print(f"📍 Environment: {os.getenv('ENVIRONMENT', 'development')}")
+    
+    # Preload models in the background; /ready reports 503 until done
+    from services.warmup_service import warmup_service
+    # Only warm the services whose routers are mounted
+    warmup_service.models = [name for name in warmup_service.models if name in ENABLED_ROUTERS]
+    app.state.warmup_task = asyncio.create_task(warmup_service.run_async())
+    
     yield
     print("👋 ML Service đang tắt...")
+    from utils.database import db
+    db.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -51,54 +86,42 @@ async def root():
         "service": "Siêu Thị ABC ML Service",
         "status": "running",
         "version": "1.0.0",
-        "endpoints": {
-            "customer_segmentation": "/api/ml/customer-segmentation",
-            "revenue_prediction": "/api/ml/revenue-prediction",
-            "product_association": "/api/ml/product-association",
-            "product_classifier": "/api/ml/product-classifier",
-            "image_classification": "/api/ml/image-classification"
-        }
+        "endpoints": {name: API_ROUTERS[name][1] for name in ENABLED_ROUTERS}
     }
 
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
+    from utils.database import db
+    from utils.snapshot import snapshots
+    from utils.model_loader import model_loader
+    
     return {
         "status": "healthy",
         "database": "connected",
-        "models": "loaded"
+        "database_pool": db.pool_stats(),
+        "snapshots": snapshots.status() if snapshots.enabled else "disabled",
+        "models": model_loader.cache_stats()
     }
 
-# Mount API routers
-app.include_router(
-    customer_segmentation.router,
-    prefix="/api/ml",
-    tags=["Customer Segmentation"]
-)
-
-app.include_router(
-    revenue_prediction.router,
-    prefix="/api/ml",
-    tags=["Revenue Prediction"]
-)
-
-app.include_router(
-    product_association.router,
-    prefix="/api/ml",
-    tags=["Product Association"]
-)
-
-app.include_router(
-    product_classifier.router,
-    prefix="/api/ml",
-    tags=["Product Classifier"]
-)
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 503 until the startup warm-up has finished"""
+    from services.warmup_service import warmup_service
+    
+    state = warmup_service.state()
+    if not state['ready']:
+        return JSONResponse(status_code=503, content=state)
+    return state
 
-app.include_router(
-    image_classification.router,
-    prefix="/api/ml",
-    tags=["Image Classification"]
-)
+# Mount API routers
+for name in ENABLED_ROUTERS:
+    module_name, _, tag = API_ROUTERS[name]
+    app.include_router(
+        importlib.import_module(module_name).router,
+        prefix="/api/ml",
+        tags=[tag]
+    )
 
 # Error handlers
 @app.exception_handler(HTTPException)
@@ -0,0 +1,143 @@
+"""
+Sparse Transaction Encoding for Association Mining
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Optional, TYPE_CHECKING
+
+# scipy is imported when transactions are encoded, not with the module
+if TYPE_CHECKING:
+    from scipy import sparse
+
+def sparse_frame(matrix: "sparse.spmatrix") -> pd.DataFrame:
+    """
+    One-hot frame backed by sparse bool columns
+
+    Columns are the matrix column positions (mlxtend requires sparse
+    integer column names to start at 0).
+    """
+    from scipy import sparse
+    frame = pd.DataFrame.sparse.from_spmatrix(sparse.csr_matrix(matrix, dtype=np.uint8))
+    return frame.astype(pd.SparseDtype(bool, False))
+
+class EncodedTransactions:
+    """Integer-coded transactions stored as a sparse order x product matrix"""
+
+    def __init__(self, matrix: "sparse.csr_matrix", order_ids: np.ndarray,
+                 product_ids: np.ndarray, product_names: Dict[int, str],
+                 order_dates: Optional[np.ndarray] = None, n_lines: int = 0,
+                 last_order_id: Optional[int] = None, last_order_date=None):
+        self.matrix = matrix              # CSR bool, one row per order
+        self.order_ids = order_ids        # row -> order_id
+        self.order_dates = order_dates    # row -> created_at (datetime64), if available
+        self.product_ids = product_ids    # column -> product_id
+        self.product_names = product_names  # product_id -> product name
+        # Order lines read, and the newest order among them (dropped orders included)
+        self.n_lines = n_lines
+        self.last_order_id = last_order_id
+        self.last_order_date = last_order_date
+
+    @property
+    def n_transactions(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def n_products(self) -> int:
+        return self.matrix.shape[1]
+
+    def to_sparse_frame(self) -> pd.DataFrame:
+        """One-hot frame backed by sparse bool columns (see sparse_frame)"""
+        return sparse_frame(self.matrix)
+
+    def to_product_ids(self, itemset) -> frozenset:
+        """Map an itemset of column positions to product_ids"""
+        return frozenset(int(self.product_ids[j]) for j in itemset)
+
+    def column_index(self) -> Dict[int, int]:
+        """product_id -> column position"""
+        return {int(p): j for j, p in enumerate(self.product_ids)}
+
+    def decode(self, itemset) -> frozenset:
+        """Map an itemset of column positions back to product names"""
+        return frozenset(
+            self.product_names.get(int(self.product_ids[j]), str(self.product_ids[j]))
+            for j in itemset
+        )
+
+def encode_transactions(transactions_data: List[Dict[str, Any]],
+                        min_items: int = 2) -> EncodedTransactions:
+    """
+    Encode order lines into a sparse bool matrix in one vectorized pass
+
+    Orders with fewer than `min_items` lines are dropped, the same rule
+    the list-based prepare_transactions applies.
+    """
+    return encode_transaction_frame(pd.DataFrame(transactions_data), min_items=min_items)
+
+def encode_transaction_frame(df: pd.DataFrame, min_items: int = 2) -> EncodedTransactions:
+    """
+    Encode an order-line frame (e.g. Database.get_transactions_columns().to_frame())
+
+    Works on the columns directly: product_name may be a Categorical and
+    created_at is optional.
+    """
+    from scipy import sparse
+    
+    if df.empty:
+        return EncodedTransactions(
+            matrix=sparse.csr_matrix((0, 0), dtype=bool),
+            order_ids=np.empty(0, dtype=np.int64),
+            product_ids=np.empty(0, dtype=np.int64),
+            product_names={}
+        )
+
+    order_values = df['order_id'].to_numpy(dtype=np.int64)
+    dates = pd.to_datetime(df['created_at']).to_numpy() if 'created_at' in df.columns else None
+
+    order_codes, order_ids = pd.factorize(order_values)
+    product_codes, product_ids = pd.factorize(df['product_id'].to_numpy(dtype=np.int64), sort=True)
+
+    # product_id <-> name dictionary kept on the side (first name seen wins)
+    first_seen = np.unique(product_codes, return_index=True)[1]
+    names = df['product_name'].iloc[first_seen].tolist()
+    product_names = {
+        int(product_ids[code]): str(name)
+        for code, name in zip(product_codes[first_seen], names)
+    }
+
+    # Keep orders with enough lines
+    lines_per_order = np.bincount(order_codes, minlength=len(order_ids))
+    keep_orders = lines_per_order >= min_items
+    row_map = np.cumsum(keep_orders) - 1
+    keep_lines = keep_orders[order_codes]
+
+    rows = row_map[order_codes[keep_lines]]
+    cols = product_codes[keep_lines]
+
+    # Drop duplicate (order, product) pairs before building the matrix
+    n_products = len(product_ids)
+    pairs = np.unique(rows.astype(np.int64) * n_products + cols)
+    rows, cols = np.divmod(pairs, n_products)
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=bool), (rows, cols)),
+        shape=(int(keep_orders.sum()), n_products)
+    )
+
+    order_dates = None
+    if dates is not None:
+        first_line = np.unique(order_codes, return_index=True)[1]
+        order_dates = dates[first_line][keep_orders]
+
+    last_line = int(np.argmax(order_values))
+    return EncodedTransactions(
+        matrix=matrix,
+        order_ids=np.asarray(order_ids)[keep_orders],
+        product_ids=np.asarray(product_ids),
+        product_names=product_names,
+        order_dates=order_dates,
+        n_lines=len(order_values),
+        last_order_id=int(order_values[last_line]),
+        last_order_date=None if dates is None else pd.Timestamp(dates[last_line]).to_pydatetime()
+    )
@@ -2,27 +2,67 @@
 Apriori Product Association Service
 """
 
+import copy
+import heapq
+import numpy as np
 import pandas as pd
-from mlxtend.frequent_patterns import apriori, association_rules
-from mlxtend.preprocessing import TransactionEncoder
-from typing import Dict, List, Any
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime, timedelta
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from utils.database import db
+from utils.snapshot import snapshots
 from utils.helpers import calculate_confidence, calculate_lift
 from utils.model_loader import model_loader, MODEL_APRIORI
+from preprocessing.transaction_encoding import encode_transaction_frame
+from services.mining_engines import mine_frequent_itemsets, count_itemsets, MINING_ENGINES, ENGINE_APRIORI
+from services.rule_store import Vocabulary, ItemsetTable, RuleTable, format_metric
+
+# model_loader alias naming the window variant the service serves
+ACTIVE_MODEL_ALIAS = "product_association_active"
 
 class AprioriService:
     """Product association using Apriori algorithm"""
     
-    def __init__(self, min_support: float = 0.01, min_confidence: float = 0.3):
+    def __init__(self, min_support: float = 0.01, min_confidence: float = 0.3,
+                 engine: str = ENGINE_APRIORI, tracking_ratio: float = 0.75,
+                 top_k: int = 20, n_workers: int = 1,
+                 window_days: Optional[int] = None, half_life_days: Optional[float] = None):
         self.min_support = min_support
         self.min_confidence = min_confidence
-        self.rules = None
-        self.frequent_itemsets = None
+        self.engine = engine
+        self.n_workers = n_workers
+        # Train only on the last window_days, optionally decaying older orders
+        self.window_days = window_days
+        self.half_life_days = half_life_days
+        self.tracking_ratio = tracking_ratio
+        self.product_names: Dict[int, str] = {}
+        self.vocabulary: Optional[Vocabulary] = None
+        # Incremental state: product_id itemset -> order count, plus high-water mark.
+        # Kept as a compact table after loading and unpacked only for updates
+        self.itemset_counts: Optional[Dict[frozenset, int]] = None
+        self.tracked_itemsets: Optional[ItemsetTable] = None
+        self.n_transactions = 0
+        self.border_count = 0
+        self.last_order_id: Optional[int] = None
+        self.last_created_at = None
+        self.rules: Optional[RuleTable] = None
+        self.frequent_itemsets: Optional[ItemsetTable] = None
+        self.top_k = top_k
+        # item -> rule rows whose antecedents contain it (offsets/rules arrays);
+        # built lazily since the precomputed table answers most requests
+        self.rule_index: Optional[Dict[str, np.ndarray]] = None
+        # item -> its top_k (rule row, consequent slot) pairs (offsets/rules/slots arrays)
+        self.recommendation_table: Optional[Dict[str, np.ndarray]] = None
+        # model_loader object the state was loaded from (or saved as)
+        self.model_data: Optional[Dict[str, Any]] = None
+        # Pre-sorted views for paging: rule rows by lift, and for every
+        # min_length the itemset rows of at least that length by support
+        self.lift_order: Optional[np.ndarray] = None
+        self.itemset_views: Dict[int, np.ndarray] = {}
     
     def prepare_transactions(self, transactions_data: List[Dict]) -> List[List[str]]:
         """Prepare transaction data"""
@@ -37,98 +77,578 @@ class AprioriService:
         
         return transactions
     
-    def train(self, retrain: bool = False) -> Dict[str, Any]:
-        """Train Apriori model (generate association rules)"""
-        if not retrain and model_loader.model_exists(MODEL_APRIORI):
+    @property
+    def model_name(self) -> str:
+        """Model file of the current window, so every window keeps its own rule set"""
+        name = MODEL_APRIORI
+        if self.window_days:
+            name += f"_w{self.window_days}d"
+        if self.half_life_days:
+            name += f"_hl{self.half_life_days:g}d"
+        return name
+    
+    @property
+    def active_model_name(self) -> str:
+        """Model served for recommendations (the last one activated by any process)"""
+        return model_loader.resolve_alias(ACTIVE_MODEL_ALIAS) or MODEL_APRIORI
+    
+    def train_and_activate(self, retrain: bool = False, incremental: bool = False,
+                           measure_memory: bool = False, **params) -> Dict[str, Any]:
+        """
+        Train (or load) the model for these parameters and serve it if that succeeds
+        
+        Training runs on a separate instance, so a failed or running
+        training never changes the rules being served.
+        """
+        trainer = AprioriService(tracking_ratio=self.tracking_ratio, top_k=self.top_k, **params)
+        result = trainer.train(retrain=retrain, incremental=incremental, measure_memory=measure_memory)
+        
+        if result['success']:
+            model_loader.set_alias(ACTIVE_MODEL_ALIAS, trainer.model_name)
             self.load_model()
+            result['model_name'] = trainer.model_name
+        return result
+    
+    def train(self, retrain: bool = False, incremental: bool = False,
+              measure_memory: bool = False) -> Dict[str, Any]:
+        """
+        Train Apriori model (generate association rules)
+        
+        measure_memory adds the mining peak memory to mining_stats (slower;
+        for comparing engines).
+        """
+        if incremental:
+            return self.train_incremental(measure_memory)
+        
+        if not retrain and model_loader.model_exists(self.model_name):
+            self.load_model(self.model_name)
             return {
                 "success": True,
                 "message": "Model đã tồn tại, sử dụng model có sẵn",
                 "model_loaded": True
             }
         
-        # Get transaction data
-        transactions_data = db.get_transactions_data()
+        if self.engine not in MINING_ENGINES:
+            return {
+                "success": False,
+                "message": f"Engine không hợp lệ: {self.engine} (hỗ trợ: {', '.join(MINING_ENGINES)})"
+            }
+        
+        # Get transaction data (only the window when one is set)
+        since_date = None
+        if self.window_days:
+            since_date = datetime.now() - timedelta(days=self.window_days)
+        # Encode transactions as a sparse order x product_id matrix
+        encoded = encode_transaction_frame(
+            snapshots.frame("transactions", since_date=since_date, current=True)
+        )
         
-        if not transactions_data:
+        if encoded.n_lines == 0:
             return {
                 "success": False,
                 "message": "Không có dữ liệu giao dịch"
             }
         
-        # Prepare transactions
-        transactions = self.prepare_transactions(transactions_data)
+        n_transactions = encoded.n_transactions
         
-        if len(transactions) < 50:
+        if n_transactions < 50:
             return {
                 "success": False,
                 "message": "Không đủ dữ liệu (cần ít nhất 50 giao dịch)"
             }
         
-        # Encode transactions
-        te = TransactionEncoder()
-        te_ary = te.fit(transactions).transform(transactions)
-        df = pd.DataFrame(te_ary, columns=te.columns_)
-        
-        # Find frequent itemsets
-        self.frequent_itemsets = apriori(
-            df,
-            min_support=self.min_support,
-            use_colnames=True
+        # Mine slightly below min_support so the counts of near-frequent
+        # itemsets are tracked for incremental updates
+        tracking_support = self.min_support * self.tracking_ratio
+        weights = self._recency_weights(encoded) if self.half_life_days else None
+        mined_itemsets, mining_stats = mine_frequent_itemsets(
+            encoded.matrix,
+            min_support=tracking_support,
+            engine=self.engine,
+            n_workers=self.n_workers,
+            weights=weights,
+            measure_memory=measure_memory
         )
         
-        if len(self.frequent_itemsets) == 0:
+        # Weighted supports give fractional counts; they are never updated incrementally
+        itemset_counts = {
+            encoded.to_product_ids(itemset): (
+                support * n_transactions if weights is not None
+                else int(round(support * n_transactions))
+            )
+            for itemset, support in zip(mined_itemsets['itemsets'], mined_itemsets['support'])
+        }
+        
+        if not self._commit_state(
+            itemset_counts=itemset_counts,
+            product_names=encoded.product_names,
+            n_transactions=n_transactions,
+            # Every untracked itemset has support < tracking_support
+            border_count=int(np.ceil(tracking_support * n_transactions)) - 1,
+            last_order_id=encoded.last_order_id,
+            last_created_at=encoded.last_order_date
+        ):
             return {
                 "success": False,
                 "message": "Không tìm thấy itemset phổ biến với min_support hiện tại"
             }
         
-        # Generate association rules
-        self.rules = association_rules(
-            self.frequent_itemsets,
-            metric="confidence",
-            min_threshold=self.min_confidence
+        return {
+            "success": True,
+            "message": f"Training thành công với {n_transactions} giao dịch",
+            "n_transactions": n_transactions,
+            "n_frequent_itemsets": len(self.frequent_itemsets),
+            "n_rules": len(self.rules),
+            "min_support": self.min_support,
+            "min_confidence": self.min_confidence,
+            # Weighted mining always runs ECLAT
+            "engine": mining_stats['engine'],
+            "window_days": self.window_days,
+            "half_life_days": self.half_life_days,
+            "mining_stats": mining_stats
+        }
+    
+    def train_incremental(self, measure_memory: bool = False) -> Dict[str, Any]:
+        """
+        Update itemset counts with orders delivered after the last run
+        
+        Only orders with id above the stored high-water mark are read. If the
+        bound on untracked itemsets could reach min_support, a full re-mine
+        is done instead so the result always matches a full training run.
+        Orders that reach 'delivered' after the watermark has passed their id
+        are picked up by the next full training.
+        """
+        if self.window_days or self.half_life_days:
+            # A sliding window drops old orders and decay reweights all of
+            # them, so counts cannot simply be added to
+            result = self.train(retrain=True, measure_memory=measure_memory)
+            result['incremental'] = False
+            return result
+        
+        # The request's thresholds win over the stored model's: tracked counts
+        # hold for any threshold, and the border check below re-mines fully
+        # when they cannot support a lower min_support
+        requested = (self.min_support, self.min_confidence, self.engine)
+        # Continue from the current version (another process may have saved or rolled back)
+        self.load_model(self.model_name)
+        previous = (self.min_support, self.min_confidence)
+        self.min_support, self.min_confidence, self.engine = requested
+        thresholds = {
+            "min_support": self.min_support,
+            "min_confidence": self.min_confidence,
+            "previous_min_support": previous[0],
+            "previous_min_confidence": previous[1]
+        }
+        thresholds_changed = previous != requested[:2]
+        
+        if self.itemset_counts is None and self.tracked_itemsets is not None:
+            self.itemset_counts = self._unpack_tracked_itemsets()
+        
+        if self.itemset_counts is None:
+            # No model yet, or saved before incremental support
+            return self.train(retrain=True, measure_memory=measure_memory)
+        
+        encoded = encode_transaction_frame(
+            snapshots.frame("transactions", since_id=self.last_order_id, current=True)
         )
+        n_new = encoded.n_transactions if encoded.n_lines > 0 else 0
+        
+        if n_new == 0 and not thresholds_changed:
+            return {
+                "success": True,
+                "message": "Không có đơn hàng mới kể từ lần training trước",
+                "incremental": True,
+                "n_new_transactions": 0,
+                "last_order_id": self.last_order_id,
+                **thresholds
+            }
+        
+        n_total = self.n_transactions + n_new
+        border_count = self.border_count
+        # Updated on a copy, so the current state survives a failure below
+        itemset_counts = dict(self.itemset_counts)
+        product_names = dict(self.product_names)
+        last_order_id, last_created_at = self.last_order_id, self.last_created_at
+        
+        if n_new > 0:
+            # Every untracked itemset contains an itemset of the negative border
+            # (untracked, all subsets tracked), so it gains at most as many new
+            # orders as the most frequent border itemset in this batch
+            columns = encoded.column_index()
+            item_counts = encoded.matrix.getnnz(axis=0)
+            border_gain = max(
+                (int(item_counts[j]) for p, j in columns.items()
+                 if frozenset([p]) not in itemset_counts),
+                default=0
+            )
+            border = [
+                tuple(columns[p] for p in itemset)
+                for itemset in self._negative_border()
+                if all(p in columns for p in itemset)
+            ]
+            if border:
+                border_gain = max(border_gain, int(count_itemsets(encoded.matrix, border).max()))
+            border_count += border_gain
+        
+        if border_count / n_total >= self.min_support:
+            result = self.train(retrain=True, measure_memory=measure_memory)
+            result['incremental'] = False
+            result['message'] = "Itemset chưa theo dõi có thể vượt min_support, đã training lại toàn bộ. " + result['message']
+            return result
         
-        # Save model
-        model_data = {
-            'frequent_itemsets': self.frequent_itemsets,
-            'rules': self.rules,
-            'min_support': self.min_support,
-            'min_confidence': self.min_confidence
+        tracked = list(itemset_counts)
+        was_frequent = {
+            itemset for itemset in tracked
+            if itemset_counts[itemset] / self.n_transactions >= self.min_support
         }
-        model_loader.save_model(model_data, MODEL_APRIORI)
+        
+        if n_new > 0:
+            # Count tracked itemsets in the new orders
+            countable = [k for k, itemset in enumerate(tracked) if all(p in columns for p in itemset)]
+            new_counts = count_itemsets(
+                encoded.matrix,
+                [tuple(columns[p] for p in tracked[k]) for k in countable]
+            )
+            for k, count in zip(countable, new_counts):
+                itemset_counts[tracked[k]] += int(count)
+            
+            product_names.update(encoded.product_names)
+            if last_order_id is None or encoded.last_order_id > last_order_id:
+                last_order_id, last_created_at = encoded.last_order_id, encoded.last_order_date
+        
+        is_frequent = {
+            itemset for itemset in tracked
+            if itemset_counts[itemset] / n_total >= self.min_support
+        }
+        n_crossed = len(was_frequent ^ is_frequent)
+        
+        if not self._commit_state(
+            itemset_counts=itemset_counts,
+            product_names=product_names,
+            n_transactions=n_total,
+            border_count=border_count,
+            last_order_id=last_order_id,
+            last_created_at=last_created_at
+        ):
+            return {
+                "success": False,
+                "message": "Không tìm thấy itemset phổ biến với min_support hiện tại"
+            }
+        
+        message = f"Cập nhật thành công với {n_new} giao dịch mới"
+        if thresholds_changed:
+            message += " (dùng min_support / min_confidence của yêu cầu thay cho giá trị của model trước)"
         
         return {
             "success": True,
-            "message": f"Training thành công với {len(transactions)} giao dịch",
-            "n_transactions": len(transactions),
+            "message": message,
+            "incremental": True,
+            "n_new_transactions": n_new,
+            "n_transactions": n_total,
+            "n_itemsets_crossed_threshold": n_crossed,
             "n_frequent_itemsets": len(self.frequent_itemsets),
             "n_rules": len(self.rules),
-            "min_support": self.min_support,
-            "min_confidence": self.min_confidence
+            "last_order_id": self.last_order_id,
+            **thresholds
         }
     
-    def load_model(self) -> bool:
-        """Load trained model"""
-        model_data = model_loader.load_model(MODEL_APRIORI)
+    def _commit_state(self, **state) -> bool:
+        """
+        Derive rules from new itemset counts, save them, then adopt the new state
+        
+        The work is done on a shallow copy, so if deriving or saving fails
+        (or finds no frequent itemset) this instance keeps its previous state.
+        """
+        candidate = copy.copy(self)
+        candidate.__dict__.update(state)
+        if not candidate._derive_rules():
+            return False
+        candidate.save_model()
+        self.__dict__.update(candidate.__dict__)
+        return True
+    
+    def _recency_weights(self, encoded) -> np.ndarray:
+        """Exponential decay weight per transaction: 0.5 ** (age_days / half_life_days)"""
+        age_days = (np.datetime64(datetime.now()) - encoded.order_dates) / np.timedelta64(1, 'D')
+        return np.power(0.5, np.maximum(age_days, 0) / self.half_life_days)
+    
+    def _negative_border(self) -> List[frozenset]:
+        """Untracked itemsets (size >= 2) whose subsets are all tracked"""
+        tracked = set(self.itemset_counts)
+        by_length = defaultdict(list)
+        for itemset in tracked:
+            by_length[len(itemset)].append(tuple(sorted(itemset)))
+        
+        border = []
+        for length, itemsets in by_length.items():
+            # Apriori-gen join: itemsets sharing all but the last item
+            by_prefix = defaultdict(list)
+            for itemset in itemsets:
+                by_prefix[itemset[:-1]].append(itemset[-1])
+            
+            for prefix, lasts in by_prefix.items():
+                lasts.sort()
+                for i, a in enumerate(lasts):
+                    for b in lasts[i + 1:]:
+                        candidate = prefix + (a, b)
+                        if frozenset(candidate) in tracked:
+                            continue
+                        if all(
+                            frozenset(candidate[:k] + candidate[k + 1:]) in tracked
+                            for k in range(length + 1)
+                        ):
+                            border.append(frozenset(candidate))
+        return border
+    
+    def _derive_rules(self) -> bool:
+        """Derive frequent itemsets and rules from the tracked itemset counts"""
+        n_transactions = self.n_transactions
+        frequent = [
+            (count / n_transactions, itemset)
+            for itemset, count in self.itemset_counts.items()
+            if count / n_transactions >= self.min_support
+        ]
+        
+        if not frequent:
+            return False
+        
+        frequent_itemsets = pd.DataFrame(frequent, columns=['support', 'itemsets'])
+        
+        # Generate association rules
+        from mlxtend.frequent_patterns import association_rules
+        rules = association_rules(
+            frequent_itemsets,
+            metric="confidence",
+            min_threshold=self.min_confidence
+        )
+        
+        # Keep itemsets and rules as compact item-index arrays
+        self.vocabulary = Vocabulary.from_product_names(self.product_names)
+        self.frequent_itemsets = ItemsetTable.from_itemsets(
+            [[self.vocabulary.index_of(p) for p in itemset] for itemset in frequent_itemsets['itemsets']],
+            frequent_itemsets['support']
+        )
+        self.rules = RuleTable.from_frame(rules, self.vocabulary)
+        self.tracked_itemsets = None
+        self.rule_index = None
+        self._build_recommendation_table()
+        self._build_sorted_views()
+        return True
+    
+    def _pack_tracked_itemsets(self) -> ItemsetTable:
+        """Compact form of the incremental itemset counts"""
+        itemsets = list(self.itemset_counts)
+        counts = [self.itemset_counts[itemset] for itemset in itemsets]
+        return ItemsetTable.from_itemsets(
+            [[self.vocabulary.index_of(p) for p in itemset] for itemset in itemsets],
+            [count / self.n_transactions for count in counts],
+            counts
+        )
+    
+    def _unpack_tracked_itemsets(self) -> Dict[frozenset, int]:
+        """Incremental itemset counts keyed by product_id itemsets"""
+        table = self.tracked_itemsets
+        product_ids = self.vocabulary.product_ids
+        return {
+            frozenset(product_ids[table.itemset(i)].tolist()): table.counts[i].item()
+            for i in range(len(table))
+        }
+    
+    def save_model(self) -> None:
+        """Save trained model as compact arrays together with the incremental state"""
+        tracked = self.tracked_itemsets
+        if self.itemset_counts is not None:
+            tracked = self._pack_tracked_itemsets()
+        
+        arrays = {
+            'min_support': np.float64(self.min_support),
+            'min_confidence': np.float64(self.min_confidence),
+            'engine': np.str_(self.engine),
+            'n_transactions': np.int64(self.n_transactions),
+            'border_count': np.int64(self.border_count),
+            'last_order_id': np.int64(-1 if self.last_order_id is None else self.last_order_id),
+            'last_created_at': np.str_('' if self.last_created_at is None else str(self.last_created_at)),
+            'top_k': np.int64(self.top_k),
+            'window_days': np.int64(self.window_days or 0),
+            'half_life_days': np.float64(self.half_life_days or 0),
+            'table_offsets': self.recommendation_table['offsets'],
+            'table_rules': self.recommendation_table['rules'],
+            'table_slots': self.recommendation_table['slots']
+        }
+        arrays.update(self.vocabulary.to_arrays())
+        arrays.update(self.frequent_itemsets.to_arrays("itemset_"))
+        arrays.update(self.rules.to_arrays())
+        if tracked is not None:
+            arrays.update(tracked.to_arrays("tracked_"))
+        
+        model_loader.save_arrays(arrays, self.model_name)
+        self.model_data = arrays
+    
+    def load_model(self, model_name: Optional[str] = None) -> bool:
+        """
+        Load the current version of a model (no-op when it is already loaded)
+        
+        Defaults to the active model, so every process serves the window
+        last activated by train_and_activate.
+        """
+        if model_name is None:
+            model_name = self.active_model_name
+        arrays = model_loader.load_arrays(model_name)
+        
+        if arrays is None:
+            # Models saved before the compact format are pickled DataFrames
+            model_data = model_loader.load_model(model_name)
+            if not model_data:
+                return False
+            if model_data is not self.model_data:
+                self._load_legacy_model(model_data)
+                self.model_data = model_data
+            return True
         
-        if model_data:
-            self.frequent_itemsets = model_data['frequent_itemsets']
-            self.rules = model_data['rules']
-            self.min_support = model_data['min_support']
-            self.min_confidence = model_data['min_confidence']
+        if arrays is self.model_data:
             return True
-        return False
+        
+        self.min_support = float(arrays['min_support'])
+        self.min_confidence = float(arrays['min_confidence'])
+        self.engine = str(arrays['engine'])
+        self.n_transactions = int(arrays['n_transactions'])
+        self.border_count = int(arrays['border_count'])
+        self.last_order_id = int(arrays['last_order_id']) if arrays['last_order_id'] >= 0 else None
+        self.last_created_at = str(arrays['last_created_at']) or None
+        self.top_k = int(arrays['top_k'])
+        self.window_days = int(arrays['window_days']) or None
+        self.half_life_days = float(arrays['half_life_days']) or None
+        
+        self.vocabulary = Vocabulary.from_arrays(arrays)
+        self.product_names = dict(zip(
+            self.vocabulary.product_ids.tolist(), self.vocabulary.names.tolist()
+        ))
+        self.frequent_itemsets = ItemsetTable.from_arrays(arrays, "itemset_")
+        self.rules = RuleTable.from_arrays(arrays)
+        self.tracked_itemsets = (
+            ItemsetTable.from_arrays(arrays, "tracked_") if 'tracked_offsets' in arrays else None
+        )
+        self.itemset_counts = None
+        self.rule_index = None
+        self.recommendation_table = {
+            'offsets': arrays['table_offsets'],
+            'rules': arrays['table_rules'],
+            'slots': arrays['table_slots']
+        }
+        self._build_sorted_views()
+        # Last, so a concurrent caller only takes the fast path once the state is complete
+        self.model_data = arrays
+        return True
+    
+    def _load_legacy_model(self, model_data: Dict[str, Any]) -> bool:
+        """Convert a pickled DataFrame model (itemsets of product names)"""
+        names = sorted(set().union(*model_data['frequent_itemsets']['itemsets']))
+        # Product ids are unknown in these models; use placeholder negative ids
+        name_ids = {name: -(i + 1) for i, name in enumerate(names)}
+        
+        self.min_support = model_data['min_support']
+        self.min_confidence = model_data['min_confidence']
+        self.engine = model_data.get('engine', ENGINE_APRIORI)
+        self.product_names = {product_id: name for name, product_id in name_ids.items()}
+        self.vocabulary = Vocabulary.from_product_names(self.product_names)
+        
+        def to_ids(itemset):
+            return frozenset(name_ids[name] for name in itemset)
+        
+        frequent_itemsets = model_data['frequent_itemsets']
+        rules = model_data['rules'].copy()
+        rules['antecedents'] = rules['antecedents'].map(to_ids)
+        rules['consequents'] = rules['consequents'].map(to_ids)
+        
+        self.frequent_itemsets = ItemsetTable.from_itemsets(
+            [[self.vocabulary.index_of(name_ids[name]) for name in itemset]
+             for itemset in frequent_itemsets['itemsets']],
+            frequent_itemsets['support']
+        )
+        self.rules = RuleTable.from_frame(rules, self.vocabulary)
+        # No incremental state: the next incremental run retrains fully
+        self.itemset_counts = None
+        self.tracked_itemsets = None
+        self.last_order_id = None
+        self.rule_index = None
+        self._build_recommendation_table()
+        self._build_sorted_views()
+        return True
+    
+    def _build_sorted_views(self):
+        """Sort rules by lift and itemsets by support once, so listings are slices"""
+        self.lift_order = np.argsort(-self.rules.lift, kind='stable').astype(np.int32)
+        
+        itemsets = self.frequent_itemsets
+        lengths = itemsets.lengths
+        by_support = np.argsort(-itemsets.support, kind='stable').astype(np.int32)
+        self.itemset_views = {
+            length: by_support[lengths[by_support] >= length]
+            for length in range(1, int(lengths.max(initial=0)) + 1)
+        }
+    
+    def _get_rule_index(self) -> Dict[str, np.ndarray]:
+        """Inverted index from antecedent items to rule rows (best rule first)"""
+        if self.rule_index is None:
+            self.rule_index = self.rules.antecedent_index(len(self.vocabulary))
+        return self.rule_index
+    
+    def _build_recommendation_table(self) -> None:
+        """Precompute each item's top_k recommended items from the rule index"""
+        index = self._get_rule_index()
+        index_offsets = index['offsets'].tolist()
+        index_rules = index['rules']
+        consequent_offsets = self.rules.consequents.offsets.tolist()
+        consequent_items = self.rules.consequents.items
+        
+        offsets = [0]
+        table_rules: List[int] = []
+        table_slots: List[int] = []
+        
+        for item in range(len(self.vocabulary)):
+            seen = set()
+            for rule in index_rules[index_offsets[item]:index_offsets[item + 1]].tolist():
+                start, end = consequent_offsets[rule], consequent_offsets[rule + 1]
+                for slot, consequent in enumerate(consequent_items[start:end].tolist()):
+                    if consequent in seen:
+                        continue
+                    seen.add(consequent)
+                    table_rules.append(rule)
+                    table_slots.append(slot)
+                    if len(seen) >= self.top_k:
+                        break
+                if len(seen) >= self.top_k:
+                    break
+            offsets.append(len(table_rules))
+        
+        self.recommendation_table = {
+            'offsets': np.asarray(offsets, dtype=np.int64),
+            'rules': np.asarray(table_rules, dtype=np.int32),
+            'slots': np.asarray(table_slots, dtype=np.int32)
+        }
+    
+    def _table_entries(self, item: int) -> List[Tuple[int, int]]:
+        """Precomputed (rule row, consequent slot) pairs for an item, best first"""
+        table = self.recommendation_table
+        start, end = table['offsets'][item], table['offsets'][item + 1]
+        return list(zip(table['rules'][start:end].tolist(), table['slots'][start:end].tolist()))
+    
+    def _index_entries(self, item: int):
+        """Yield (rule row, consequent slot) pairs for an item from the rule index, best first"""
+        index = self._get_rule_index()
+        start, end = index['offsets'][item], index['offsets'][item + 1]
+        consequent_lengths = self.rules.consequents.lengths
+        for rule in index['rules'][start:end].tolist():
+            for slot in range(consequent_lengths[rule]):
+                yield (rule, slot)
     
     def get_recommendations(self, product_names: List[str], top_n: int = 5) -> Dict[str, Any]:
         """Get product recommendations based on cart items"""
-        if self.rules is None:
-            if not self.load_model():
-                return {
-                    "success": False,
-                    "message": "Model chưa được training"
-                }
+        if not self.load_model():
+            return {
+                "success": False,
+                "message": "Model chưa được training"
+            }
         
         if not product_names:
             return {
@@ -136,40 +656,7 @@ class AprioriService:
                 "message": "Danh sách sản phẩm trống"
             }
         
-        # Find rules where antecedents contain any of the input products
-        recommendations = []
-        
-        for _, rule in self.rules.iterrows():
-            antecedents = set(rule['antecedents'])
-            consequents = set(rule['consequents'])
-            
-            # Check if any input product is in antecedents
-            if any(p in antecedents for p in product_names):
-                # Check if consequents are not already in cart
-                new_products = consequents - set(product_names)
-                
-                if new_products:
-                    for product in new_products:
-                        recommendations.append({
-                            "product_name": product,
-                            "confidence": float(rule['confidence']),
-                            "lift": float(rule['lift']),
-                            "support": float(rule['support']),
-                            "rule": f"{list(antecedents)} → {list(consequents)}"
-                        })
-        
-        # Sort by confidence and lift
-        recommendations.sort(key=lambda x: (x['confidence'], x['lift']), reverse=True)
-        
-        # Remove duplicates and take top N
-        seen = set()
-        unique_recommendations = []
-        for rec in recommendations:
-            if rec['product_name'] not in seen:
-                seen.add(rec['product_name'])
-                unique_recommendations.append(rec)
-                if len(unique_recommendations) >= top_n:
-                    break
+        unique_recommendations = self._recommend(frozenset(product_names), top_n)
         
         return {
             "success": True,
@@ -178,64 +665,180 @@ class AprioriService:
             "total_recommendations": len(unique_recommendations)
         }
     
-    def get_top_rules(self, top_n: int = 10) -> Dict[str, Any]:
-        """Get top association rules"""
-        if self.rules is None:
-            if not self.load_model():
-                return {
+    def _recommend(self, cart: frozenset, top_n: int) -> List[Dict[str, Any]]:
+        """Top-N products recommended for a set of cart products"""
+        items = [item for name in cart for item in self.vocabulary.items_named(name)]
+        
+        if len(items) == 1 and top_n <= self.top_k:
+            # Product page: a single table lookup (a product never recommends itself)
+            candidates = self._table_entries(items[0])[:top_n]
+        elif top_n + len(items) - 1 <= self.top_k:
+            # Each cart product's list can lose at most len(cart) - 1 entries to
+            # other cart items, so merging the short lists is still exact
+            candidates = heapq.merge(*(self._table_entries(item) for item in items))
+        else:
+            # Only the rules indexed under products in the cart are visited; rule
+            # rows are ranked by (confidence, lift) so a k-way heap merge yields
+            # candidates best-first and we can stop as soon as top_n are found
+            candidates = heapq.merge(*(self._index_entries(item) for item in items))
+        
+        consequents = self.rules.consequents
+        seen = set()
+        unique_recommendations = []
+        for rule, slot in candidates:
+            if len(unique_recommendations) >= top_n:
+                break
+            
+            product = str(self.vocabulary.names[consequents.items[consequents.offsets[rule] + slot]])
+            
+            # Skip products already in cart or already recommended
+            if product in cart or product in seen:
+                continue
+            
+            seen.add(product)
+            unique_recommendations.append({
+                "product_name": product,
+                "confidence": format_metric(self.rules.confidence[rule]),
+                "lift": format_metric(self.rules.lift[rule]),
+                "support": format_metric(self.rules.support[rule]),
+                "rule": self.rules.describe(rule, self.vocabulary)
+            })
+        
+        return unique_recommendations
+    
+    def get_batch_recommendations(self, carts: List[List[str]], top_n: int = 5) -> Dict[str, Any]:
+        """Get product recommendations for many carts in one call"""
+        if not self.load_model():
+            return {
+                "success": False,
+                "message": "Model chưa được training"
+            }
+        
+        # Carts with the same products share one lookup
+        computed: Dict[frozenset, List[Dict[str, Any]]] = {}
+        results = []
+        
+        for product_names in carts:
+            if not product_names:
+                results.append({
                     "success": False,
-                    "message": "Model chưa được training"
-                }
+                    "input_products": product_names,
+                    "message": "Danh sách sản phẩm trống"
+                })
+                continue
+            
+            cart = frozenset(product_names)
+            if cart not in computed:
+                computed[cart] = self._recommend(cart, top_n)
+            
+            results.append({
+                "success": True,
+                "input_products": product_names,
+                "recommendations": computed[cart],
+                "total_recommendations": len(computed[cart])
+            })
+        
+        return {
+            "success": True,
+            "total_carts": len(carts),
+            "results": results
+        }
+    
+    def get_top_rules(self, top_n: int = 10, offset: int = 0) -> Dict[str, Any]:
+        """Get top association rules by lift, one page of top_n from offset"""
+        if not self.load_model():
+            return {
+                "success": False,
+                "message": "Model chưa được training"
+            }
         
-        # Sort rules by lift
-        top_rules = self.rules.nlargest(top_n, 'lift')
+        offset = max(offset, 0)
+        top_rows = self.lift_order[offset:offset + max(top_n, 0)]
         
         rules_list = []
-        for _, rule in top_rules.iterrows():
+        for row in top_rows.tolist():
             rules_list.append({
-                "antecedents": list(rule['antecedents']),
-                "consequents": list(rule['consequents']),
-                "support": float(rule['support']),
-                "confidence": float(rule['confidence']),
-                "lift": float(rule['lift'])
+                "antecedents": self.vocabulary.decode(self.rules.antecedents.itemset(row)),
+                "consequents": self.vocabulary.decode(self.rules.consequents.itemset(row)),
+                "support": format_metric(self.rules.support[row]),
+                "confidence": format_metric(self.rules.confidence[row]),
+                "lift": format_metric(self.rules.lift[row])
             })
         
         return {
             "success": True,
             "total_rules": len(self.rules),
+            "offset": offset,
             "top_rules": rules_list
         }
     
-    def get_frequent_itemsets(self, min_length: int = 2, top_n: int = 20) -> Dict[str, Any]:
-        """Get frequent itemsets"""
-        if self.frequent_itemsets is None:
-            if not self.load_model():
-                return {
-                    "success": False,
-                    "message": "Model chưa được training"
-                }
-        
-        # Filter by itemset length
-        filtered = self.frequent_itemsets[
-            self.frequent_itemsets['itemsets'].apply(lambda x: len(x) >= min_length)
-        ]
+    def get_frequent_itemsets(self, min_length: int = 2, top_n: int = 20,
+                              offset: int = 0) -> Dict[str, Any]:
+        """Get frequent itemsets by support, one page of top_n from offset"""
+        if not self.load_model():
+            return {
+                "success": False,
+                "message": "Model chưa được training"
+            }
         
-        # Sort by support
-        top_itemsets = filtered.nlargest(top_n, 'support')
+        itemsets = self.frequent_itemsets
+        lengths = itemsets.lengths
+        view = self.itemset_views.get(max(min_length, 1), np.empty(0, dtype=np.int32))
+        offset = max(offset, 0)
+        top_rows = view[offset:offset + max(top_n, 0)]
         
         itemsets_list = []
-        for _, row in top_itemsets.iterrows():
+        for row in top_rows.tolist():
             itemsets_list.append({
-                "items": list(row['itemsets']),
-                "support": float(row['support']),
-                "length": len(row['itemsets'])
+                "items": self.vocabulary.decode(itemsets.itemset(row)),
+                "support": format_metric(itemsets.support[row]),
+                "length": int(lengths[row])
             })
         
         return {
             "success": True,
-            "total_itemsets": len(self.frequent_itemsets),
+            "total_itemsets": len(itemsets),
+            "total_matching": len(view),
+            "offset": offset,
             "frequent_itemsets": itemsets_list
         }
+    
+    def get_recommendation_table(self) -> Dict[str, Any]:
+        """Every product's precomputed top_k recommendations as flat rows, for write-back"""
+        if not self.load_model():
+            return {
+                "success": False,
+                "message": "Model chưa được training"
+            }
+        
+        if (self.vocabulary.product_ids <= 0).any():
+            # Legacy models only have placeholder ids, which are not real products
+            return {
+                "success": False,
+                "message": "Model cũ không có mã sản phẩm, cần training lại trước khi ghi khuyến nghị"
+            }
+        
+        table = self.recommendation_table
+        counts = np.diff(table['offsets'])
+        items = np.repeat(np.arange(len(self.vocabulary)), counts)
+        rank = np.arange(len(table['rules'])) - np.repeat(table['offsets'][:-1], counts) + 1
+        consequents = self.rules.consequents
+        recommended = consequents.items[consequents.offsets[table['rules']] + table['slots']]
+        
+        rows = pd.DataFrame({
+            "product_id": self.vocabulary.product_ids[items],
+            "rank": rank,
+            "recommended_product_id": self.vocabulary.product_ids[recommended],
+            "confidence": self.rules.confidence[table['rules']],
+            "lift": self.rules.lift[table['rules']],
+            "support": self.rules.support[table['rules']]
+        })
+        
+        return {
+            "success": True,
+            "total_products": int((counts > 0).sum()),
+            "recommendations": rows
+        }
 
 # Singleton instance
 apriori_service = AprioriService()
@@ -2,12 +2,11 @@
 Decision Tree Revenue Prediction Service
 """
 
+import threading
+import time
 import numpy as np
 import pandas as pd
-from sklearn.tree import DecisionTreeRegressor, DecisionTreeClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import sys
 import os
@@ -15,32 +14,64 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from utils.database import db
-from utils.helpers import calculate_mae, calculate_rmse, get_date_features, calculate_rfm_score, get_customer_segment_label
+from utils.snapshot import snapshots
+from utils.helpers import calculate_mae, calculate_rmse, get_date_features, get_date_feature_arrays, calculate_rfm_score, get_customer_segment_label
 from utils.model_loader import model_loader, MODEL_DECISION_TREE, MODEL_CUSTOMER_CLASSIFIER
+from services.revenue_series import DailyRevenueSeries, SHORT_WINDOW, LONG_WINDOW
+
+# Longest horizon predict_range serves in one call
+MAX_FORECAST_DAYS = 366
+
+# Forecasts roll forward at most this many days past the last observed day
+MAX_ROLL_DAYS = 3660
+
+# Most predictions predict_batch serves in one call
+MAX_BATCH_PREDICTIONS = 50000
 
 class DecisionTreeService:
     """Revenue prediction using Decision Tree"""
     
-    def __init__(self, max_depth: int = 10):
+    def __init__(self, max_depth: int = 10, series_refresh_interval: float = 300):
         self.max_depth = max_depth
         self.model = None
-        self.scaler = StandardScaler()
+        self.model_data = None  # model_loader object the attributes came from
+        self.scaler = None
+        self.daily_series = DailyRevenueSeries.empty()
+        self.series_refresh_interval = series_refresh_interval
+        self.series_refreshed_at = 0.0
+        self._series_lock = threading.Lock()  # held while a refresh runs
+        self._tree = None  # model and its node arrays, for single-row predictions
+        # Rolled-forward features past the series: (model_data, series, roll_start, features, windows)
+        self._rolled = None
         self.feature_names = [
             'month', 'weekday', 'items_count', 
             'avg_order_7d', 'avg_order_30d'
         ]
     
-    def prepare_data(self, orders_data: List[Dict]) -> pd.DataFrame:
-        """Prepare orders data for training"""
-        df = pd.DataFrame(orders_data)
+    def prepare_data(self, orders_data: Union[List[Dict], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Prepare orders data for training
+        
+        avg_order_7d / avg_order_30d are the average order value over the 7 /
+        30 calendar days before each order's day, computed by the same
+        DailyRevenueSeries.window_averages used at prediction time (days
+        without orders count as empty). Orders with no earlier order in the
+        window get the mean order total.
+        """
+        df = orders_data if isinstance(orders_data, pd.DataFrame) else pd.DataFrame(orders_data)
         
         # Convert created_at to datetime
         df['created_at'] = pd.to_datetime(df['created_at'])
-        df = df.sort_values('created_at')
-        
-        # Calculate rolling averages
-        df['avg_order_7d'] = df['total'].rolling(window=7, min_periods=1).mean()
-        df['avg_order_30d'] = df['total'].rolling(window=30, min_periods=1).mean()
+        df = df.sort_values('created_at', kind='stable')
+        
+        days = df['created_at'].to_numpy().astype('datetime64[D]')
+        daily = pd.DataFrame({"day": days, "total": df['total'].to_numpy(dtype=np.float64)}).groupby('day').agg(
+            n_orders=('total', 'size'), revenue=('total', 'sum')
+        ).reset_index()
+        default = float(df['total'].mean())
+        df['avg_order_7d'], df['avg_order_30d'] = DailyRevenueSeries.from_frame(daily).window_averages(
+            days, default, default
+        )
         
         # Target variable
         df['revenue'] = df['total']
@@ -58,9 +89,9 @@ class DecisionTreeService:
             }
         
         # Get training data
-        orders_data = db.get_orders_data()
+        orders_data = snapshots.frame("order_features", current=True)
         
-        if not orders_data or len(orders_data) < 100:
+        if len(orders_data) < 100:
             return {
                 "success": False,
                 "message": "Không đủ dữ liệu (cần ít nhất 100 đơn hàng)"
@@ -71,36 +102,50 @@ class DecisionTreeService:
         X = df[self.feature_names].values
         y = df['revenue'].values
         
+        # sklearn is only imported once a model is trained; serving loads pickles
+        from sklearn.tree import DecisionTreeRegressor
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.model_selection import train_test_split
+        
         # Split train/test
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42
         )
         
         # Normalize features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        X_test_scaled = scaler.transform(X_test)
         
         # Train model
-        self.model = DecisionTreeRegressor(
+        model = DecisionTreeRegressor(
             max_depth=self.max_depth,
             random_state=42,
             min_samples_split=10,
             min_samples_leaf=5
         )
-        self.model.fit(X_train_scaled, y_train)
+        model.fit(X_train_scaled, y_train)
         
         # Evaluate
-        y_pred = self.model.predict(X_test_scaled)
+        y_pred = model.predict(X_test_scaled)
         mae = calculate_mae(y_test, y_pred)
         rmse = calculate_rmse(y_test, y_pred)
         
+        # Daily revenue up to now, for the average-order features at prediction time
+        daily_series = DailyRevenueSeries.from_frame(snapshots.frame("daily_revenue", current=True))
+        
         # Save model
         model_data = {
-            'model': self.model,
-            'scaler': self.scaler,
-            'feature_names': self.feature_names
+            'model': model,
+            'scaler': scaler,
+            'feature_names': self.feature_names,
+            'daily_revenue': daily_series.to_arrays(),
+            # Window features of days without order history, as in prepare_data
+            'average_defaults': (float(df['total'].mean()),) * 2
         }
         model_loader.save_model(model_data, MODEL_DECISION_TREE)
+        # Serve the new version only now that it is complete
+        self.load_model()
         
         return {
             "success": True,
@@ -110,28 +155,76 @@ class DecisionTreeService:
             "test_size": len(X_test),
             "mae": float(mae),
             "rmse": float(rmse),
-            "max_depth": self.max_depth
+            "max_depth": self.max_depth,
+            "n_days": len(daily_series)
         }
     
     def load_model(self) -> bool:
-        """Load trained model"""
+        """Load the current model version (no-op when it is already loaded)"""
         model_data = model_loader.load_model(MODEL_DECISION_TREE)
         
         if model_data:
-            self.model = model_data['model']
-            self.scaler = model_data['scaler']
-            self.feature_names = model_data['feature_names']
+            if model_data is not self.model_data:
+                self.model = model_data['model']
+                self.scaler = model_data['scaler']
+                self.feature_names = model_data['feature_names']
+                # Models saved before the series existed start empty and fill on refresh
+                if 'daily_revenue' in model_data:
+                    self.daily_series = DailyRevenueSeries.from_arrays(model_data['daily_revenue'])
+                else:
+                    self.daily_series = DailyRevenueSeries.empty()
+                self.series_refreshed_at = 0.0
+                self.model_data = model_data
             return True
         return False
     
+    def refresh_daily_series(self, force: bool = False) -> DailyRevenueSeries:
+        """
+        Current daily series, refreshed at most every series_refresh_interval seconds
+        
+        The refresh runs on the database executor, so requests keep using the
+        current series until the refreshed one is swapped in; force=True
+        refreshes before returning.
+        """
+        now = time.time()
+        if force:
+            with self._series_lock:
+                self.series_refreshed_at = now
+                self._refresh_daily_series()
+        elif now - self.series_refreshed_at >= self.series_refresh_interval and self._series_lock.acquire(blocking=False):
+            self.series_refreshed_at = now
+            try:
+                db.executor.submit(self._refresh_daily_series_locked)
+            except Exception:
+                self._series_lock.release()
+                raise
+        return self.daily_series
+    
+    def _refresh_daily_series_locked(self):
+        try:
+            self._refresh_daily_series()
+        finally:
+            self._series_lock.release()
+    
+    def _refresh_daily_series(self):
+        """Read the days from the series' last day on (it may have been partial) and apply them"""
+        series = self.daily_series
+        since_date = None if series.start is None else pd.Timestamp(series.last_day).to_pydatetime()
+        try:
+            refreshed = series.refreshed(db.get_daily_revenue_columns(since_date=since_date).to_frame())
+            # A model loaded meanwhile brought its own series
+            if self.daily_series is series:
+                self.daily_series = refreshed
+        except Exception as e:
+            print(f"⚠️  Không cập nhật được doanh thu theo ngày: {e}")
+    
     def predict_revenue(self, date: datetime, items_count: int = 3) -> Dict[str, Any]:
         """Predict revenue for a specific date"""
-        if not self.model:
-            if not self.load_model():
-                return {
-                    "success": False,
-                    "message": "Model chưa được training"
-                }
+        if not self.load_model():
+            return {
+                "success": False,
+                "message": "Model chưa được training"
+            }
         
         # Ensure model is loaded after load_model call
         if self.model is None:
@@ -140,95 +233,348 @@ class DecisionTreeService:
                 "message": "Model chưa được training"
             }
         
-        # Get historical averages (mock for now)
-        avg_order_7d = 150000
-        avg_order_30d = 145000
+        try:
+            forecast = self._forecast(np.array([date.date()], dtype='datetime64[D]'), items_count)
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
         
-        # Prepare features
         date_features = get_date_features(date)
-        features = np.array([[
-            date_features['month'],
-            date_features['weekday'],
-            items_count,
-            avg_order_7d,
-            avg_order_30d
-        ]])
-        
-        # Scale and predict
-        features_scaled = self.scaler.transform(features)
-        prediction = float(self.model.predict(features_scaled)[0])
-        
         return {
             "success": True,
             "date": date.strftime("%Y-%m-%d"),
-            "predicted_revenue": prediction,
+            "predicted_revenue": float(forecast['predicted_revenue'][0]),
             "features": {
                 "month": date_features['month'],
                 "weekday": date_features['weekday'],
-                "items_count": items_count
+                "items_count": items_count,
+                "avg_order_7d": float(forecast['avg_order_7d'][0]),
+                "avg_order_30d": float(forecast['avg_order_30d'][0])
             }
         }
     
-    def forecast_next_days(self, days: int = 7) -> Dict[str, Any]:
-        """Forecast revenue for next N days"""
-        if not self.model:
-            if not self.load_model():
-                return {
-                    "success": False,
-                    "message": "Model chưa được training"
-                }
+    def _feature_matrix(self, dates, items_count, avg_order_7d, avg_order_30d) -> np.ndarray:
+        """
+        Feature matrix with one row per date, columns in feature_names order
+        
+        items_count and the averages may be scalars or one value per date.
+        """
+        columns = get_date_feature_arrays(dates)
+        n_rows = len(columns['month'])
+        columns['items_count'] = items_count
+        columns['avg_order_7d'] = avg_order_7d
+        columns['avg_order_30d'] = avg_order_30d
+        
+        return np.column_stack([
+            np.broadcast_to(np.asarray(columns[name], dtype=np.float64), n_rows)
+            for name in self.feature_names
+        ])
+    
+    def _predict_features(self, features: np.ndarray) -> np.ndarray:
+        """Scale and predict every row of a feature matrix in one pass"""
+        return self.model.predict(self.scaler.transform(features))
+    
+    def _predict_one(self, row: List[float]) -> float:
+        """Same as _predict_features for one row, walking the tree without sklearn's per-call overhead"""
+        if self._tree is None or self._tree[0] is not self.model:
+            tree = self.model.tree_
+            self._tree = (
+                self.model,
+                tree.children_left.tolist(), tree.children_right.tolist(),
+                tree.feature.tolist(), tree.threshold.tolist(), tree.value[:, 0, 0].tolist(),
+                self.scaler.mean_.tolist(), self.scaler.scale_.tolist()
+            )
+        _, left, right, feature, threshold, value, mean, scale = self._tree
+        
+        # sklearn compares float32 features against the split thresholds
+        x = [float(np.float32((v - m) / s)) for v, m, s in zip(row, mean, scale)]
+        node = 0
+        while left[node] != -1:
+            node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+        return value[node]
+    
+    def _average_defaults(self) -> Tuple[float, float]:
+        """Average-order features for days without order history"""
+        if self.model_data and 'average_defaults' in self.model_data:
+            return tuple(self.model_data['average_defaults'])
+        # Older models: training means of the features
+        mean = self.scaler.mean_
+        return (
+            float(mean[self.feature_names.index('avg_order_7d')]),
+            float(mean[self.feature_names.index('avg_order_30d')])
+        )
+    
+    def _window_features(self, days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        avg_order_7d / avg_order_30d for each of `days` (datetime64[D])
+        
+        Days up to the day after the last observed one use the real 7/30-day
+        windows before them. Later days are rolled forward from the last
+        observed day: each day is predicted with a typical basket (the
+        training mean items_count) and enters the windows at the recent daily
+        order count. The features therefore depend on the date only, so every
+        basket-size scenario of a date shares them.
+        """
+        series = self.refresh_daily_series()
+        default_7d, default_30d = self._average_defaults()
+        
+        avg_7d = np.empty(len(days))
+        avg_30d = np.empty(len(days))
+        
+        if series.start is None:
+            observed = np.zeros(len(days), dtype=bool)
+        else:
+            observed = days <= series.last_day + 1
+        
+        if observed.any():
+            avg_7d[observed], avg_30d[observed] = series.window_averages(days[observed], default_7d, default_30d)
+        
+        future = ~observed
+        if future.any():
+            roll_start = days[future].min() if series.start is None else series.last_day + 1
+            n_roll = int((days[future].max() - roll_start).astype(np.int64)) + 1
+            if n_roll > MAX_ROLL_DAYS:
+                raise ValueError(f"Ngày dự báo cách dữ liệu gần nhất quá {MAX_ROLL_DAYS} ngày")
+            
+            rolled = self._rolled_features(series, roll_start, n_roll)
+            offsets = (days[future] - roll_start).astype(np.int64)
+            avg_7d[future], avg_30d[future] = rolled[:, offsets]
         
-        today = datetime.now()
-        forecasts = []
+        return avg_7d, avg_30d
+    
+    def _rolled_features(self, series: DailyRevenueSeries, roll_start: np.datetime64, n_roll: int) -> np.ndarray:
+        """
+        (avg_order_7d, avg_order_30d) rows for the n_roll days from roll_start, rolled forward
+        
+        The trajectory only depends on the model, the series and roll_start,
+        so it is cached and only extended when a later day is asked for.
+        """
+        default_7d, default_30d = self._average_defaults()
+        cached = self._rolled
+        if (cached is not None and cached[0] is self.model_data
+                and cached[1] is series and cached[2] == roll_start):
+            _, _, _, done, windows = cached
+            if done.shape[1] >= n_roll:
+                return done[:, :n_roll]
+            # The cached windows are shared with concurrent readers
+            windows = windows.copy()
+        else:
+            done = np.empty((2, 0))
+            windows = series.windows.copy()
+        
+        first = done.shape[1]
+        rolled_days = roll_start + np.arange(first, n_roll)
+        date_features = get_date_feature_arrays(rolled_days)
+        months = date_features['month'].tolist()
+        weekdays = date_features['weekday'].tolist()
+        position = {name: i for i, name in enumerate(self.feature_names)}
+        
+        orders_per_day = series.windows.orders_per_day() or 1.0
+        row = [0.0] * len(self.feature_names)
+        row[position['items_count']] = float(self.scaler.mean_[position['items_count']])
+        rolled = np.empty((2, n_roll - first))
+        
+        for k in range(n_roll - first):
+            day_7d, day_30d = windows.averages(default_7d, default_30d)
+            row[position['month']] = months[k]
+            row[position['weekday']] = weekdays[k]
+            row[position['avg_order_7d']] = day_7d
+            row[position['avg_order_30d']] = day_30d
+            rolled[:, k] = (day_7d, day_30d)
+            windows.push(self._predict_one(row) * orders_per_day, orders_per_day)
+        
+        rolled = np.concatenate([done, rolled], axis=1)
+        self._rolled = (self.model_data, series, roll_start, rolled, windows)
+        return rolled
+    
+    def _forecast(self, days: np.ndarray, items_count) -> Dict[str, np.ndarray]:
+        """
+        Predictions and average-order features for `days` (datetime64[D])
+        
+        items_count is a scalar or one value per day; all rows are scaled
+        and predicted in one pass.
+        """
+        unique_days, inverse = np.unique(days, return_inverse=True)
+        unique_7d, unique_30d = self._window_features(unique_days)
+        avg_7d, avg_30d = unique_7d[inverse], unique_30d[inverse]
+        
+        features = self._feature_matrix(days, items_count, avg_7d, avg_30d)
+        return {
+            "predicted_revenue": self._predict_features(features),
+            "avg_order_7d": avg_7d,
+            "avg_order_30d": avg_30d
+        }
+    
+    def predict_range(self, start_date: datetime, end_date: datetime, items_count: int = 3) -> Dict[str, Any]:
+        """Forecast revenue for every day from start_date to end_date (inclusive)"""
+        if not self.load_model():
+            return {
+                "success": False,
+                "message": "Model chưa được training"
+            }
         
-        for i in range(days):
-            future_date = today + timedelta(days=i+1)
-            result = self.predict_revenue(future_date)
-            
-            if result['success']:
-                forecasts.append({
-                    "date": result['date'],
-                    "predicted_revenue": result['predicted_revenue']
-                })
+        start = np.datetime64(start_date.date(), 'D')
+        end = np.datetime64(end_date.date(), 'D')
+        n_days = int((end - start).astype(np.int64)) + 1
+        
+        if n_days < 1:
+            return {"success": False, "message": "Ngày kết thúc phải sau ngày bắt đầu"}
+        if n_days > MAX_FORECAST_DAYS:
+            return {"success": False, "message": f"Khoảng dự báo tối đa {MAX_FORECAST_DAYS} ngày"}
         
-        total_forecast = sum(f['predicted_revenue'] for f in forecasts)
-        avg_daily = total_forecast / len(forecasts) if forecasts else 0
+        days = start + np.arange(n_days)
+        try:
+            predictions = self._forecast(days, items_count)['predicted_revenue']
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        
+        forecasts = [
+            {"date": day, "predicted_revenue": prediction}
+            for day, prediction in zip(days.astype(str).tolist(), predictions.tolist())
+        ]
+        total_forecast = float(predictions.sum())
         
         return {
             "success": True,
-            "forecast_period": f"{days} ngày",
-            "start_date": (today + timedelta(days=1)).strftime("%Y-%m-%d"),
-            "end_date": (today + timedelta(days=days)).strftime("%Y-%m-%d"),
+            "start_date": str(start),
+            "end_date": str(end),
+            "n_days": n_days,
+            "items_count": items_count,
             "total_predicted_revenue": total_forecast,
-            "avg_daily_revenue": avg_daily,
+            "avg_daily_revenue": total_forecast / n_days,
             "daily_forecasts": forecasts
         }
+    
+    def forecast_next_days(self, days: int = 7) -> Dict[str, Any]:
+        """Forecast revenue for next N days"""
+        today = datetime.now()
+        result = self.predict_range(today + timedelta(days=1), today + timedelta(days=days))
+        
+        if result['success']:
+            result['forecast_period'] = f"{days} ngày"
+        return result
+    
+    def predict_batch(self, dates: List[datetime], items_counts: List[int], grid: bool = True) -> Dict[str, Any]:
+        """
+        Predict revenue for many (date, items_count) scenarios at once
+        
+        With grid every date is combined with every items_count; otherwise
+        they are paired by position (a single items_count applies to every
+        date). All rows go through one scaler.transform and model.predict.
+        """
+        if not self.load_model():
+            return {
+                "success": False,
+                "message": "Model chưa được training"
+            }
+        
+        if not dates or not items_counts:
+            return {"success": False, "message": "Cần ít nhất một ngày và một items_count"}
+        
+        days = np.array([date.date() for date in dates], dtype='datetime64[D]')
+        counts = np.asarray(items_counts, dtype=np.int64)
+        
+        if grid:
+            n_predictions = len(days) * len(counts)
+        elif len(counts) in (1, len(days)):
+            n_predictions = len(days)
+        else:
+            return {"success": False, "message": "Số items_count phải bằng 1 hoặc bằng số ngày"}
+        
+        if n_predictions > MAX_BATCH_PREDICTIONS:
+            return {"success": False, "message": f"Tối đa {MAX_BATCH_PREDICTIONS} dự đoán mỗi lần"}
+        
+        if grid:
+            # Date-major: all items_count scenarios of a date are adjacent
+            days = np.repeat(days, len(counts))
+            counts = np.tile(counts, len(dates))
+        else:
+            counts = np.broadcast_to(counts, len(days))
+        
+        try:
+            predictions = self._forecast(days, counts)['predicted_revenue']
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        
+        return {
+            "success": True,
+            "n_predictions": n_predictions,
+            "predictions": [
+                {"date": day, "items_count": count, "predicted_revenue": prediction}
+                for day, count, prediction in zip(
+                    days.astype(str).tolist(), counts.tolist(), predictions.tolist()
+                )
+            ]
+        }
+    
+    async def get_revenue_history_async(self, days: int = 30) -> Dict[str, Any]:
+        """get_revenue_history with the daily extract awaited on the DB executor"""
+        daily = await snapshots.frame_async("daily_revenue")
+        return self.get_revenue_history(days, daily)
+    
+    def get_revenue_history(self, days: int = 30, daily: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        """
+        Daily delivered revenue for the last `days` calendar days with
+        7/30-day moving averages (mean daily revenue, days without orders
+        counted as zero)
+        """
+        if daily is None:
+            daily = snapshots.frame("daily_revenue")
+        if daily.empty:
+            return {"success": False, "message": "Không có dữ liệu doanh thu"}
+        
+        series = DailyRevenueSeries.from_frame(daily)
+        offsets = np.arange(max(len(series) - days, 0), len(series))
+        history_days = series.start + offsets.astype('timedelta64[D]')
+        # Windows ending at each day, shorter at the start of the series
+        sums = series.window_sums(history_days + np.timedelta64(1, 'D'))
+        avg_7d = sums['revenue_7d'] / np.minimum(offsets + 1, SHORT_WINDOW)
+        avg_30d = sums['revenue_30d'] / np.minimum(offsets + 1, LONG_WINDOW)
+        history = [
+            {
+                "date": pd.Timestamp(day).strftime("%Y-%m-%d"),
+                "n_orders": int(n_orders),
+                "revenue": float(revenue),
+                "avg_revenue_7d": float(day_avg_7d),
+                "avg_revenue_30d": float(day_avg_30d)
+            }
+            for day, n_orders, revenue, day_avg_7d, day_avg_30d in zip(
+                history_days, series.n_orders[offsets], series.revenue[offsets], avg_7d, avg_30d
+            )
+        ]
+        
+        return {
+            "success": True,
+            "days": len(history),
+            "history": history
+        }
 
 class CustomerClassificationService:
     """Customer classification using Decision Tree"""
     
     def __init__(self):
         self.model = None
+        self.model_data = None  # model_loader object the attributes came from
         self.feature_names = ['recency', 'frequency', 'monetary']
         
-    def prepare_data(self, customers_data: List[Dict]) -> pd.DataFrame:
+    def prepare_data(self, customers_data: Union[List[Dict], pd.DataFrame]) -> pd.DataFrame:
         """Prepare customer data"""
-        df = pd.DataFrame(customers_data)
-        
-        # Calculate RFM features
-        df['recency'] = df['days_since_last_order']
-        df['frequency'] = df['total_orders']
-        df['monetary'] = df['total_spent']
-        
-        # Calculate RFM score and label (Target)
-        df['rfm_score'] = df.apply(
-            lambda row: calculate_rfm_score(
-                row['recency'],
-                row['frequency'],
-                row['monetary']
-            ),
-            axis=1
-        )
+        df = customers_data if isinstance(customers_data, pd.DataFrame) else pd.DataFrame(customers_data)
+        
+        # RFM features and score come precomputed from get_customer_rfm_columns;
+        # raw customer rows are scored here
+        if 'rfm_score' not in df.columns:
+            df['recency'] = df['days_since_last_order']
+            df['frequency'] = df['total_orders']
+            df['monetary'] = df['total_spent']
+            
+            df['rfm_score'] = df.apply(
+                lambda row: calculate_rfm_score(
+                    row['recency'],
+                    row['frequency'],
+                    row['monetary']
+                ),
+                axis=1
+            )
         
         # Use heuristic label as target for Decision Tree
         df['label'] = df['rfm_score'].apply(get_customer_segment_label)
@@ -241,8 +587,8 @@ class CustomerClassificationService:
             self.load_model()
             return {"success": True, "message": "Model đã tồn tại, sử dụng model có sẵn"}
             
-        customers_data = db.get_customers_data()
-        if not customers_data:
+        customers_data = snapshots.frame("customer_rfm", current=True)
+        if customers_data.empty:
             return {"success": False, "message": "Không có dữ liệu khách hàng"}
             
         df = self.prepare_data(customers_data)
@@ -250,27 +596,29 @@ class CustomerClassificationService:
         y = df['label'].tolist()
         
         # Train
-        self.model = DecisionTreeClassifier(max_depth=5, random_state=42)
-        self.model.fit(X, y)
+        from sklearn.tree import DecisionTreeClassifier
+        model = DecisionTreeClassifier(max_depth=5, random_state=42)
+        model.fit(X, y)
         
         # Save
         model_data = {
-            'model': self.model,
+            'model': model,
             'feature_names': self.feature_names
         }
         model_loader.save_model(model_data, MODEL_CUSTOMER_CLASSIFIER)
+        # Serve the new version only now that it is complete
+        self.load_model()
         
         return {
             "success": True, 
             "message": f"Training thành công với {len(customers_data)} khách hàng",
-            "classes": list(self.model.classes_)
+            "classes": list(model.classes_)
         }
 
     def predict(self, recency, frequency, monetary) -> str:
         """Predict customer segment"""
-        if not self.model:
-            if not self.load_model():
-                return "Unknown (Model not loaded)"
+        if not self.load_model():
+            return "Unknown (Model not loaded)"
         
         # Ensure model is loaded
         if self.model is None:
@@ -279,18 +627,23 @@ class CustomerClassificationService:
         X = np.array([[recency, frequency, monetary]])
         return self.model.predict(X)[0]
 
-    def segment_all_customers(self) -> Dict[str, Any]:
+    async def segment_all_customers_async(self) -> Dict[str, Any]:
+        """segment_all_customers with the customer extract awaited on the DB executor"""
+        customers_data = await snapshots.frame_async("customer_rfm")
+        return self.segment_all_customers(customers_data)
+    
+    def segment_all_customers(self, customers_data: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
         """Segment all customers"""
-        if not self.model:
-            if not self.load_model():
-                return {"success": False, "message": "Model chưa được training"}
+        if not self.load_model():
+            return {"success": False, "message": "Model chưa được training"}
         
         # Ensure model is loaded after load_model call
         if self.model is None:
             return {"success": False, "message": "Model chưa được training"}
         
-        customers_data = db.get_customers_data()
-        if not customers_data:
+        if customers_data is None:
+            customers_data = snapshots.frame("customer_rfm")
+        if customers_data.empty:
             return {"success": False, "message": "Không có dữ liệu khách hàng"}
             
         df = self.prepare_data(customers_data)
@@ -321,10 +674,12 @@ class CustomerClassificationService:
         }
 
     def load_model(self) -> bool:
-        """Load model"""
+        """Load the current model version (no-op when it is already loaded)"""
         data = model_loader.load_model(MODEL_CUSTOMER_CLASSIFIER)
         if data:
-            self.model = data['model']
+            if data is not self.model_data:
+                self.model = data['model']
+                self.model_data = data
             return True
         return False
 
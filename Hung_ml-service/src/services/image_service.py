@@ -3,7 +3,6 @@ Image Classification Service
 """
 
 import numpy as np
-from PIL import Image
 import io
 import base64
 from typing import Dict, Any, List
@@ -32,6 +31,8 @@ class ImageService:
     
     def preprocess_image(self, image_data: bytes) -> np.ndarray:
         """Preprocess image for model"""
+        from PIL import Image
+        
         # Open image
         image = Image.open(io.BytesIO(image_data))
         
@@ -88,22 +89,22 @@ class ImageService:
         }
     
     def load_model(self) -> bool:
-        """Load trained model"""
+        """Load the current model version (no-op when it is already loaded)"""
         model_data = model_loader.load_model(MODEL_IMAGE_CNN)
         
         if model_data:
-            self.model = model_data
-            self.categories = model_data.get('categories', self.categories)
-            self.image_size = model_data.get('image_size', self.image_size)
+            if model_data is not self.model:
+                self.model = model_data
+                self.categories = model_data.get('categories', self.categories)
+                self.image_size = model_data.get('image_size', self.image_size)
             return True
         return False
     
     def classify_image(self, image_data: bytes) -> Dict[str, Any]:
         """Classify product image"""
-        if not self.model:
-            if not self.load_model():
-                # Create mock model if not exists
-                self.train()
+        if not self.load_model():
+            # Create mock model if not exists
+            self.train()
         
         try:
             # Preprocess image
@@ -181,6 +182,7 @@ class ImageService:
     def get_image_info(self, image_data: bytes) -> Dict[str, Any]:
         """Get image information"""
         try:
+            from PIL import Image
             image = Image.open(io.BytesIO(image_data))
             
             return {
@@ -4,17 +4,14 @@ K-Means Product Classification Service
 
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
-from sklearn.feature_extraction.text import TfidfVectorizer
 from typing import Dict, List, Any, Optional
 import sys
 import os
-import joblib
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from utils.database import db
+from utils.snapshot import snapshots
 from utils.model_loader import model_loader, MODEL_KMEANS
 
 class ProductClusteringService:
@@ -23,7 +20,8 @@ class ProductClusteringService:
     def __init__(self, n_clusters: int = 5):
         self.n_clusters = n_clusters
         self.model = None
-        self.vectorizer = TfidfVectorizer(stop_words='english')
+        self.model_data = None  # model_loader object the attributes came from
+        self.vectorizer = None
         self.cluster_labels = {} # Map cluster ID to a human-readable label
     
     def train(self, retrain: bool = False) -> Dict[str, Any]:
@@ -38,35 +36,39 @@ class ProductClusteringService:
             }
         
         # Get training data (Products)
-        products_data = db.get_products_data()
+        df = snapshots.frame("products", current=True)
         
-        if not products_data:
+        if df.empty:
             return {
                 "success": False,
                 "message": "Không có dữ liệu sản phẩm"
             }
         
-        df = pd.DataFrame(products_data)
         # Ensure we have 'name'
         if 'name' not in df.columns:
              return {"success": False, "message": "Dữ liệu sản phẩm thiếu trường 'name'"}
 
         names = df['name'].fillna('').tolist()
         
+        # sklearn is only imported once a model is trained; serving loads pickles
+        from sklearn.cluster import KMeans
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
         # Vectorize names
-        X = self.vectorizer.fit_transform(names)
+        vectorizer = TfidfVectorizer(stop_words='english')
+        X = vectorizer.fit_transform(names)
         
         # Train K-Means
         n_clusters = min(self.n_clusters, len(names))
         if n_clusters < 2:
              n_clusters = 1
              
-        self.model = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        self.model.fit(X)
+        model = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+        model.fit(X)
         
         # Assign labels to clusters based on majority category in that cluster
-        df['cluster'] = self.model.labels_
-        self.cluster_labels = {}
+        df['cluster'] = model.labels_
+        cluster_labels = {}
         
         if 'category_name' in df.columns:
             for i in range(n_clusters):
@@ -75,35 +77,36 @@ class ProductClusteringService:
                     # Find most frequent category
                     top_cat = cluster_products['category_name'].mode()
                     if not top_cat.empty:
-                        self.cluster_labels[i] = top_cat[0]
+                        cluster_labels[i] = top_cat[0]
                     else:
-                        self.cluster_labels[i] = f"Cluster {i}"
+                        cluster_labels[i] = f"Cluster {i}"
                 else:
-                    self.cluster_labels[i] = f"Cluster {i}"
+                    cluster_labels[i] = f"Cluster {i}"
         else:
              for i in range(n_clusters):
-                 self.cluster_labels[i] = f"Cluster {i}"
+                 cluster_labels[i] = f"Cluster {i}"
 
         # Save model
         model_data = {
-            'model': self.model,
-            'vectorizer': self.vectorizer,
-            'cluster_labels': self.cluster_labels
+            'model': model,
+            'vectorizer': vectorizer,
+            'cluster_labels': cluster_labels
         }
         model_loader.save_model(model_data, MODEL_KMEANS)
+        # Serve the new version only now that it is complete
+        self.load_model()
         
         return {
             "success": True,
             "message": f"Training thành công với {len(names)} sản phẩm",
             "n_clusters": n_clusters,
-            "inertia": float(self.model.inertia_)
+            "inertia": float(model.inertia_)
         }
 
     def predict(self, product_name: str) -> Dict[str, Any]:
         """Predict category for a product name"""
-        if not self.model:
-            if not self.load_model():
-                return {"success": False, "message": "Model chưa được training"}
+        if not self.load_model():
+            return {"success": False, "message": "Model chưa được training"}
         
         # Vectorize
         X = self.vectorizer.transform([product_name])
@@ -119,33 +122,41 @@ class ProductClusteringService:
             "suggested_category": suggested_category
         }
 
-    def get_all_clusters(self) -> Dict[str, Any]:
+    async def get_all_clusters_async(self) -> Dict[str, Any]:
+        """get_all_clusters with the products extract awaited on the DB executor"""
+        products_data = await snapshots.frame_async("products")
+        return self.get_all_clusters(products_data)
+
+    def get_all_clusters(self, products_data: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
         """Get all product clusters"""
-        if not self.model:
-            if not self.load_model():
-                return {"success": False, "message": "Model chưa được training"}
+        if not self.load_model():
+            return {"success": False, "message": "Model chưa được training"}
+        # This runs on the DB executor: use one version throughout even if a
+        # newer one is swapped in meanwhile
+        model_data = self.model_data
+        model, vectorizer = model_data['model'], model_data['vectorizer']
+        cluster_labels = model_data.get('cluster_labels', {})
         
-        products_data = db.get_products_data()
-        if not products_data:
+        df = snapshots.frame("products") if products_data is None else products_data
+        if df.empty:
             return {"success": False, "message": "Không có dữ liệu sản phẩm"}
             
-        df = pd.DataFrame(products_data)
         if 'name' not in df.columns:
              return {"success": False, "message": "Dữ liệu sản phẩm thiếu trường 'name'"}
 
         names = df['name'].fillna('').tolist()
-        X = self.vectorizer.transform(names)
-        clusters = self.model.predict(X)
+        X = vectorizer.transform(names)
+        clusters = model.predict(X)
         
         df['cluster'] = clusters
-        df['suggested_category'] = df['cluster'].map(lambda x: self.cluster_labels.get(x, f"Cluster {x}"))
+        df['suggested_category'] = df['cluster'].map(lambda x: cluster_labels.get(x, f"Cluster {x}"))
         
         # Group by cluster
         result = {}
         for cluster_id in range(self.n_clusters):
             cluster_products = df[df['cluster'] == cluster_id]
             result[cluster_id] = {
-                "label": self.cluster_labels.get(cluster_id, f"Cluster {cluster_id}"),
+                "label": cluster_labels.get(cluster_id, f"Cluster {cluster_id}"),
                 "count": len(cluster_products),
                 "products": cluster_products[['id', 'name', 'price']].to_dict('records')
             }
@@ -156,12 +167,14 @@ class ProductClusteringService:
         }
 
     def load_model(self) -> bool:
-        """Load model from disk"""
+        """Load the current model version from disk (no-op when it is already loaded)"""
         model_data = model_loader.load_model(MODEL_KMEANS)
         if model_data:
-            self.model = model_data['model']
-            self.vectorizer = model_data['vectorizer']
-            self.cluster_labels = model_data.get('cluster_labels', {})
+            if model_data is not self.model_data:
+                self.model = model_data['model']
+                self.vectorizer = model_data['vectorizer']
+                self.cluster_labels = model_data.get('cluster_labels', {})
+                self.model_data = model_data
             return True
         return False
 
@@ -0,0 +1,270 @@
+"""
+Frequent Itemset Mining Engines for Product Association
+"""
+
+import time
+import tracemalloc
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from typing import Dict, List, Any, Optional, Tuple, TYPE_CHECKING
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from preprocessing.transaction_encoding import sparse_frame
+
+if TYPE_CHECKING:
+    from scipy import sparse
+
+ENGINE_APRIORI = "apriori"
+ENGINE_FPGROWTH = "fpgrowth"
+ENGINE_ECLAT = "eclat"
+
+# Parallel mining only splits when every partition gets at least this many
+# transactions; tiny partitions make almost every itemset locally frequent
+MIN_PARTITION_ROWS = 1000
+
+# Number of set bits for every byte value, used to popcount packed bitsets
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _popcount(bits: np.ndarray) -> int:
+    """Count set bits in a packed uint8 bitset"""
+    return int(_POPCOUNT[bits].sum())
+
+def _weighted_count(bits: np.ndarray, weights: np.ndarray) -> float:
+    """Sum of the weights of the transactions set in a packed bitset"""
+    return float(np.dot(np.unpackbits(bits, count=len(weights)), weights))
+
+def _frequent_item_bitsets(df: pd.DataFrame, min_support: float,
+                           weights: Optional[np.ndarray] = None) -> List[Tuple[float, int, np.ndarray]]:
+    """
+    Pack every frequent one-hot column into a vertical bitset (one bit per transaction)
+
+    Sparse frames are read column-wise from their CSC form, so the dense
+    transaction x product matrix is never materialized. With weights the
+    count of a column is the sum of its transaction weights.
+    """
+    n_transactions = len(df)
+    total = n_transactions if weights is None else float(weights.sum())
+    items = []
+
+    if hasattr(df, "sparse"):
+        csc = df.sparse.to_coo().tocsc()
+        if weights is None:
+            counts = np.diff(csc.indptr)
+        else:
+            counts = np.asarray(csc.astype(np.float64).T.dot(weights)).ravel()
+        for j in np.flatnonzero(counts / total >= min_support):
+            column = np.zeros(n_transactions, dtype=bool)
+            column[csc.indices[csc.indptr[j]:csc.indptr[j + 1]]] = True
+            items.append((counts[j].item(), int(j), np.packbits(column)))
+    else:
+        values = df.values.astype(bool)
+        counts = values.sum(axis=0) if weights is None else weights.dot(values)
+        for j in np.flatnonzero(counts / total >= min_support):
+            items.append((counts[j].item(), int(j), np.packbits(values[:, j])))
+
+    return items
+
+def eclat(df: pd.DataFrame, min_support: float = 0.5, use_colnames: bool = False,
+          max_len: Optional[int] = None, weights: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    ECLAT frequent itemset mining on vertical bitsets
+
+    Returns the same frame layout as mlxtend (support, itemsets) so the
+    result can be passed straight to association_rules. Optional per-
+    transaction weights turn support into the weighted share of transactions.
+    """
+    n_transactions = len(df)
+    columns = list(df.columns) if use_colnames else list(range(df.shape[1]))
+
+    if n_transactions == 0:
+        return pd.DataFrame(columns=["support", "itemsets"])
+
+    total = n_transactions if weights is None else float(weights.sum())
+
+    def measure(bits: np.ndarray):
+        return _popcount(bits) if weights is None else _weighted_count(bits, weights)
+
+    # Frequent single items, least frequent first to keep tidsets small
+    items = _frequent_item_bitsets(df, min_support, weights)
+    items.sort(key=lambda x: (x[0], x[1]))
+
+    supports: List[float] = []
+    itemsets: List[frozenset] = []
+
+    def extend(prefix: Tuple[int, ...], candidates: List[Tuple[int, int, np.ndarray]]):
+        for i, (count, item, bits) in enumerate(candidates):
+            itemset = prefix + (item,)
+            supports.append(count / total)
+            itemsets.append(frozenset(columns[k] for k in itemset))
+
+            if max_len is not None and len(itemset) >= max_len:
+                continue
+
+            # Intersect with every later candidate to build the next level
+            next_candidates = []
+            for other_count, other_item, other_bits in candidates[i + 1:]:
+                joined = np.bitwise_and(bits, other_bits)
+                joined_count = measure(joined)
+                if joined_count / total >= min_support:
+                    next_candidates.append((joined_count, other_item, joined))
+
+            if next_candidates:
+                extend(itemset, next_candidates)
+
+    extend((), items)
+
+    return pd.DataFrame({"support": supports, "itemsets": itemsets})
+
+def count_itemsets(matrix: "sparse.spmatrix", itemsets: List[Tuple[int, ...]]) -> np.ndarray:
+    """Exact number of rows of `matrix` containing each itemset (column positions)"""
+    from scipy import sparse
+    csc = sparse.csc_matrix(matrix)
+    n_rows = csc.shape[0]
+    bitsets: Dict[int, np.ndarray] = {}
+
+    def column_bits(j: int) -> np.ndarray:
+        if j not in bitsets:
+            column = np.zeros(n_rows, dtype=bool)
+            column[csc.indices[csc.indptr[j]:csc.indptr[j + 1]]] = True
+            bitsets[j] = np.packbits(column)
+        return bitsets[j]
+
+    counts = np.zeros(len(itemsets), dtype=np.int64)
+    for k, itemset in enumerate(itemsets):
+        bits = None
+        for j in itemset:
+            bits = column_bits(j) if bits is None else np.bitwise_and(bits, column_bits(j))
+        if bits is not None:
+            counts[k] = _popcount(bits)
+    return counts
+
+# mlxtend is imported on the first mining run, not with the service
+def apriori(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    from mlxtend.frequent_patterns import apriori as mlxtend_apriori
+    return mlxtend_apriori(df, **kwargs)
+
+def fpgrowth(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    from mlxtend.frequent_patterns import fpgrowth as mlxtend_fpgrowth
+    return mlxtend_fpgrowth(df, **kwargs)
+
+MINING_ENGINES = {
+    ENGINE_APRIORI: apriori,
+    ENGINE_FPGROWTH: fpgrowth,
+    ENGINE_ECLAT: eclat,
+}
+
+def _mine_partition(matrix: "sparse.csr_matrix", min_support: float, engine: str) -> List[Tuple[int, ...]]:
+    """SON pass 1: itemsets (column positions) locally frequent in one partition"""
+    local = MINING_ENGINES[engine](sparse_frame(matrix), min_support=min_support, use_colnames=True)
+    return [tuple(sorted(itemset)) for itemset in local['itemsets']]
+
+def _count_partition(matrix: "sparse.csr_matrix", candidates: List[Tuple[int, ...]]) -> np.ndarray:
+    """SON pass 2: exact candidate counts in one partition"""
+    return count_itemsets(matrix, candidates)
+
+def mine_parallel(matrix: "sparse.spmatrix", min_support: float, engine: str = ENGINE_APRIORI,
+                  n_workers: int = 2) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    SON two-pass frequent itemset mining over a process pool
+
+    Transactions are split into contiguous partitions. Any globally frequent
+    itemset is locally frequent in at least one partition, so the union of
+    the local results is a complete candidate set; the second pass counts the
+    candidates exactly and keeps the globally frequent ones. The result
+    equals a single-process run of the same engine.
+    """
+    from scipy import sparse
+    matrix = sparse.csr_matrix(matrix)
+    n_rows = matrix.shape[0]
+    bounds = np.linspace(0, n_rows, n_workers + 1).astype(int)
+    partitions = [matrix[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    # Guard the local threshold against rounding in count / n comparisons
+    local_support = min_support * (1 - 1e-9)
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        local_results = pool.map(
+            _mine_partition, partitions,
+            [local_support] * n_workers, [engine] * n_workers
+        )
+        candidates = sorted(set().union(*local_results))
+
+        counts = np.zeros(len(candidates), dtype=np.int64)
+        if candidates:
+            for partition_counts in pool.map(_count_partition, partitions, [candidates] * n_workers):
+                counts += partition_counts
+
+    keep = [k for k in range(len(candidates)) if counts[k] / n_rows >= min_support]
+    frequent_itemsets = pd.DataFrame({
+        "support": [counts[k] / n_rows for k in keep],
+        "itemsets": [frozenset(candidates[k]) for k in keep]
+    })
+    return frequent_itemsets, {"n_partitions": n_workers, "n_candidates": len(candidates)}
+
+def mine_frequent_itemsets(matrix: "sparse.spmatrix", min_support: float,
+                           engine: str = ENGINE_APRIORI, n_workers: int = 1,
+                           weights: Optional[np.ndarray] = None,
+                           measure_memory: bool = False) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Run the selected mining engine and measure its time (and optionally peak memory)
+
+    With n_workers > 1 the SON parallel miner is used. Weighted support is
+    only implemented by ECLAT, so passing weights selects it in a single
+    process. measure_memory traces allocations with tracemalloc, which
+    makes FP-Growth / ECLAT up to ~3x slower, so it is meant for
+    benchmarks; the reported time then includes that overhead, and with
+    n_workers > 1 the peak only covers the coordinating process.
+    """
+    if engine not in MINING_ENGINES:
+        raise ValueError(
+            f"Engine không hợp lệ: {engine} (hỗ trợ: {', '.join(MINING_ENGINES)})"
+        )
+
+    if weights is not None:
+        engine, n_workers = ENGINE_ECLAT, 1
+
+    n_workers = max(1, min(n_workers, matrix.shape[0] // MIN_PARTITION_ROWS))
+    parallel_stats: Dict[str, Any] = {}
+
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        if n_workers > 1:
+            frequent_itemsets, parallel_stats = mine_parallel(
+                matrix, min_support, engine=engine, n_workers=n_workers
+            )
+        elif weights is not None:
+            frequent_itemsets = eclat(
+                sparse_frame(matrix),
+                min_support=min_support,
+                use_colnames=True,
+                weights=weights
+            )
+        else:
+            frequent_itemsets = MINING_ENGINES[engine](
+                sparse_frame(matrix),
+                min_support=min_support,
+                use_colnames=True
+            )
+        elapsed = time.perf_counter() - start
+        if measure_memory:
+            _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if measure_memory:
+            tracemalloc.stop()
+
+    stats = {
+        "engine": engine,
+        "n_workers": n_workers,
+        "weighted": weights is not None,
+        "mining_time_s": round(elapsed, 4)
+    }
+    if measure_memory:
+        stats["peak_memory_mb"] = round(peak / (1024 * 1024), 3)
+    stats.update(parallel_stats)
+    return frequent_itemsets, stats
@@ -4,17 +4,14 @@ NLP Product Classifier Service
 
 import re
 import string
-from typing import Dict, List, Any
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.model_selection import train_test_split
+from typing import Dict, List, Any, Union
 import pandas as pd
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from utils.database import db
+from utils.snapshot import snapshots
 from utils.model_loader import model_loader, MODEL_PRODUCT_NLP
 
 class NLPService:
@@ -22,7 +19,8 @@ class NLPService:
     
     def __init__(self):
         self.model = None
-        self.vectorizer = TfidfVectorizer(max_features=1000, ngram_range=(1, 2))
+        self.model_data = None  # model_loader object the attributes came from
+        self.vectorizer = None
         self.categories = []
     
     def preprocess_text(self, text: str) -> str:
@@ -44,9 +42,9 @@ class NLPService:
         
         return text
     
-    def prepare_data(self, products_data: List[Dict]) -> pd.DataFrame:
+    def prepare_data(self, products_data: Union[List[Dict], pd.DataFrame]) -> pd.DataFrame:
         """Prepare product data for training"""
-        df = pd.DataFrame(products_data)
+        df = products_data if isinstance(products_data, pd.DataFrame) else pd.DataFrame(products_data)
         
         # Combine name and description
         df['text'] = df['name'] + ' ' + df['description'].fillna('')
@@ -68,9 +66,9 @@ class NLPService:
             }
         
         # Get product data
-        products_data = db.get_products_data()
+        products_data = snapshots.frame("products", current=True)
         
-        if not products_data or len(products_data) < 50:
+        if len(products_data) < 50:
             return {
                 "success": False,
                 "message": "Không đủ dữ liệu sản phẩm (cần ít nhất 50 sản phẩm)"
@@ -91,12 +89,18 @@ class NLPService:
         # Store categories
         self.categories = list(set(y))
         
+        # sklearn is only imported once a model is trained; serving loads pickles
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+        from sklearn.model_selection import train_test_split
+        
         # Split train/test
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42, stratify=y
         )
         
         # Vectorize
+        self.vectorizer = TfidfVectorizer(max_features=1000, ngram_range=(1, 2))
         X_train_vec = self.vectorizer.fit_transform(X_train)
         X_test_vec = self.vectorizer.transform(X_test)
         
@@ -127,24 +131,25 @@ class NLPService:
         }
     
     def load_model(self) -> bool:
-        """Load trained model"""
+        """Load the current model version (no-op when it is already loaded)"""
         model_data = model_loader.load_model(MODEL_PRODUCT_NLP)
         
         if model_data:
-            self.model = model_data['model']
-            self.vectorizer = model_data['vectorizer']
-            self.categories = model_data['categories']
+            if model_data is not self.model_data:
+                self.model = model_data['model']
+                self.vectorizer = model_data['vectorizer']
+                self.categories = model_data['categories']
+                self.model_data = model_data
             return True
         return False
     
     def classify(self, text: str) -> Dict[str, Any]:
         """Classify product text"""
-        if not self.model:
-            if not self.load_model():
-                return {
-                    "success": False,
-                    "message": "Model chưa được training"
-                }
+        if not self.load_model():
+            return {
+                "success": False,
+                "message": "Model chưa được training"
+            }
         
         # Preprocess
         text_clean = self.preprocess_text(text)
@@ -182,12 +187,11 @@ class NLPService:
     
     def batch_classify(self, texts: List[str]) -> Dict[str, Any]:
         """Classify multiple texts"""
-        if not self.model:
-            if not self.load_model():
-                return {
-                    "success": False,
-                    "message": "Model chưa được training"
-                }
+        if not self.load_model():
+            return {
+                "success": False,
+                "message": "Model chưa được training"
+            }
         
         results = []
         for text in texts:
@@ -0,0 +1,213 @@
+"""
+Materialized Daily Revenue Series for Revenue Prediction
+"""
+
+import numpy as np
+import pandas as pd
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+SHORT_WINDOW = 7
+LONG_WINDOW = 30
+
+class RevenueWindows:
+    """
+    Revenue and order count summed over the last 7 and 30 days
+
+    push() adds a day and drops the ones leaving each window in O(1). The
+    averages are the average order value over each window.
+    """
+
+    def __init__(self):
+        self.days: deque = deque(maxlen=LONG_WINDOW)  # (revenue, n_orders), oldest first
+        self.revenue_7d = 0.0
+        self.orders_7d = 0.0
+        self.revenue_30d = 0.0
+        self.orders_30d = 0.0
+
+    def push(self, revenue: float, n_orders: float):
+        if len(self.days) >= SHORT_WINDOW:
+            old_revenue, old_orders = self.days[-SHORT_WINDOW]
+            self.revenue_7d -= old_revenue
+            self.orders_7d -= old_orders
+        if len(self.days) == LONG_WINDOW:
+            old_revenue, old_orders = self.days[0]
+            self.revenue_30d -= old_revenue
+            self.orders_30d -= old_orders
+
+        self.days.append((revenue, n_orders))
+        self.revenue_7d += revenue
+        self.orders_7d += n_orders
+        self.revenue_30d += revenue
+        self.orders_30d += n_orders
+
+    def replace_last(self, revenue: float, n_orders: float):
+        """Overwrite the most recent day (it is in both windows)"""
+        old_revenue, old_orders = self.days[-1]
+        self.days[-1] = (revenue, n_orders)
+        self.revenue_7d += revenue - old_revenue
+        self.orders_7d += n_orders - old_orders
+        self.revenue_30d += revenue - old_revenue
+        self.orders_30d += n_orders - old_orders
+
+    def averages(self, default_7d: float, default_30d: float) -> Tuple[float, float]:
+        """(avg order 7d, avg order 30d); a window without orders falls back to the longer one, then the default"""
+        avg_30d = self.revenue_30d / self.orders_30d if self.orders_30d > 0 else default_30d
+        avg_7d = self.revenue_7d / self.orders_7d if self.orders_7d > 0 else (
+            avg_30d if self.orders_30d > 0 else default_7d
+        )
+        return avg_7d, avg_30d
+
+    def orders_per_day(self) -> float:
+        """Average daily order count over the 30-day window"""
+        return self.orders_30d / len(self.days) if self.days else 0.0
+
+    def copy(self) -> "RevenueWindows":
+        windows = RevenueWindows()
+        windows.days = deque(self.days, maxlen=LONG_WINDOW)
+        windows.revenue_7d, windows.orders_7d = self.revenue_7d, self.orders_7d
+        windows.revenue_30d, windows.orders_30d = self.revenue_30d, self.orders_30d
+        return windows
+
+class DailyRevenueSeries:
+    """
+    Delivered revenue and order count for every calendar day, oldest first
+
+    Days without orders are stored as zeros, so position i is day
+    start + i. `windows` holds the 7/30-day sums ending at the last day.
+    A series is not modified after construction; refreshed() returns a new
+    one, so readers never see a half-applied refresh.
+    """
+
+    def __init__(self, start: Optional[np.datetime64], revenue: np.ndarray, n_orders: np.ndarray,
+                 windows: Optional[RevenueWindows] = None):
+        self.start = start
+        self.revenue = revenue
+        self.n_orders = n_orders
+        self._cumulative: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+        if windows is None:
+            windows = RevenueWindows()
+            for day_revenue, day_orders in zip(revenue[-LONG_WINDOW:].tolist(), n_orders[-LONG_WINDOW:].tolist()):
+                windows.push(day_revenue, day_orders)
+        self.windows = windows
+
+    @classmethod
+    def empty(cls) -> "DailyRevenueSeries":
+        return cls(None, np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.int64))
+
+    @classmethod
+    def from_frame(cls, daily: pd.DataFrame) -> "DailyRevenueSeries":
+        """Build from a daily_revenue extract (day, n_orders, revenue; one row per day with orders)"""
+        if daily.empty:
+            return cls.empty()
+
+        days = pd.to_datetime(daily['day']).to_numpy().astype('datetime64[D]')
+        start = days.min()
+        positions = (days - start).astype(np.int64)
+
+        revenue = np.zeros(positions.max() + 1, dtype=np.float64)
+        n_orders = np.zeros(positions.max() + 1, dtype=np.int64)
+        np.add.at(revenue, positions, daily['revenue'].to_numpy(dtype=np.float64))
+        np.add.at(n_orders, positions, daily['n_orders'].to_numpy(dtype=np.int64))
+        return cls(start, revenue, n_orders)
+
+    def __len__(self) -> int:
+        return len(self.revenue)
+
+    @property
+    def last_day(self) -> Optional[np.datetime64]:
+        return None if self.start is None else self.start + (len(self) - 1)
+
+    def refreshed(self, daily: pd.DataFrame) -> "DailyRevenueSeries":
+        """
+        Series with the rows of a daily_revenue extract from the last day on applied
+
+        Only those days are read: the last day is re-read since it may have
+        been partial, later days are appended (gaps as zero days) and the
+        window sums are carried forward from the current ones.
+        """
+        if self.start is None:
+            return DailyRevenueSeries.from_frame(daily)
+        if daily.empty:
+            return self
+
+        days = pd.to_datetime(daily['day']).to_numpy().astype('datetime64[D]')
+        tail = DailyRevenueSeries.from_frame(daily[days >= self.last_day])
+        if tail.start is None:
+            return self
+
+        windows = self.windows.copy()
+        if tail.start == self.last_day:
+            head = len(self) - 1
+            windows.replace_last(float(tail.revenue[0]), float(tail.n_orders[0]))
+            first_new = 1
+        else:
+            head = len(self)
+            gap = int((tail.start - self.last_day).astype(np.int64)) - 1
+            for _ in range(min(gap, LONG_WINDOW)):
+                windows.push(0.0, 0.0)
+            first_new = 0
+
+        for day_revenue, day_orders in zip(tail.revenue[first_new:].tolist(), tail.n_orders[first_new:].tolist()):
+            windows.push(day_revenue, day_orders)
+
+        gap_days = int((tail.start - self.start).astype(np.int64)) - head
+        return DailyRevenueSeries(
+            self.start,
+            np.concatenate([self.revenue[:head], np.zeros(gap_days, dtype=np.float64), tail.revenue]),
+            np.concatenate([self.n_orders[:head], np.zeros(gap_days, dtype=np.int64), tail.n_orders]),
+            windows
+        )
+
+    def window_sums(self, days: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Revenue and order sums over the 7 / 30 days before each of `days`
+
+        Days must not be after last_day + 1; days before the series have
+        empty windows. Sums come from cumulative sums, so any number of days
+        costs one lookup each.
+        """
+        if self._cumulative is None:
+            self._cumulative = (
+                np.concatenate([[0.0], np.cumsum(self.revenue)]),
+                np.concatenate([[0], np.cumsum(self.n_orders)])
+            )
+        revenue_sum, orders_sum = self._cumulative
+
+        end = np.clip((np.asarray(days, dtype='datetime64[D]') - self.start).astype(np.int64), 0, len(self))
+        sums = {}
+        for name, size in (("7d", SHORT_WINDOW), ("30d", LONG_WINDOW)):
+            begin = np.maximum(end - size, 0)
+            sums[f"revenue_{name}"] = revenue_sum[end] - revenue_sum[begin]
+            sums[f"orders_{name}"] = orders_sum[end] - orders_sum[begin]
+        return sums
+
+    def window_averages(self, days: np.ndarray, default_7d: float,
+                        default_30d: float) -> Tuple[np.ndarray, np.ndarray]:
+        """RevenueWindows.averages over the 7 / 30 days before each of `days`"""
+        sums = self.window_sums(days)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_30d = np.where(sums['orders_30d'] > 0, sums['revenue_30d'] / sums['orders_30d'], default_30d)
+            avg_7d = np.where(
+                sums['orders_7d'] > 0, sums['revenue_7d'] / sums['orders_7d'],
+                np.where(sums['orders_30d'] > 0, avg_30d, default_7d)
+            )
+        return avg_7d, avg_30d
+
+    def to_arrays(self, prefix: str = "daily_") -> Dict[str, np.ndarray]:
+        start = np.datetime64('NaT', 'D') if self.start is None else self.start
+        return {
+            f"{prefix}start": np.asarray(start, dtype='datetime64[D]'),
+            f"{prefix}revenue": self.revenue,
+            f"{prefix}n_orders": self.n_orders
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str = "daily_") -> "DailyRevenueSeries":
+        start = np.datetime64(arrays[f"{prefix}start"][()], 'D')
+        return cls(
+            None if np.isnat(start) else start,
+            arrays[f"{prefix}revenue"],
+            arrays[f"{prefix}n_orders"]
+        )
@@ -0,0 +1,198 @@
+"""
+Compact Columnar Storage for Association Rules
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Iterable, Optional
+
+def _pack_itemsets(itemsets: Iterable[Iterable[int]]) -> Dict[str, np.ndarray]:
+    """Flatten itemsets of item indices into an offset array and an item array"""
+    lengths = []
+    items: List[int] = []
+    for itemset in itemsets:
+        members = sorted(itemset)
+        lengths.append(len(members))
+        items.extend(members)
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return {"offsets": offsets, "items": np.asarray(items, dtype=np.int32)}
+
+def _count_array(counts: List[float]) -> np.ndarray:
+    """int64 counts, unless some count is fractional"""
+    values = np.asarray(counts, dtype=np.float64)
+    if np.array_equal(values, np.round(values)):
+        return values.astype(np.int64)
+    return values
+
+def format_metric(value) -> float:
+    """Shortest float that round-trips a float32 metric (0.02 instead of 0.0199999...)"""
+    return float(np.format_float_positional(np.float32(value), unique=True, trim="-"))
+
+class Vocabulary:
+    """Item index <-> product_id / product name"""
+
+    def __init__(self, product_ids: np.ndarray, names: np.ndarray):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.names = np.asarray(names, dtype=str)
+        self._index = {int(p): i for i, p in enumerate(self.product_ids)}
+        self._by_name: Dict[str, List[int]] = {}
+        for i, name in enumerate(self.names.tolist()):
+            self._by_name.setdefault(name, []).append(i)
+
+    @classmethod
+    def from_product_names(cls, product_names: Dict[int, str]) -> "Vocabulary":
+        product_ids = sorted(product_names)
+        return cls(
+            np.asarray(product_ids, dtype=np.int64),
+            np.asarray([product_names[p] for p in product_ids], dtype=str)
+        )
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def index_of(self, product_id: int) -> int:
+        return self._index[int(product_id)]
+
+    def items_named(self, name: str) -> List[int]:
+        """Item indices of every product with this name"""
+        return self._by_name.get(name, [])
+
+    def decode(self, items: np.ndarray) -> List[str]:
+        return self.names[items].tolist()
+
+    def to_arrays(self, prefix: str = "vocab_") -> Dict[str, np.ndarray]:
+        return {f"{prefix}product_ids": self.product_ids, f"{prefix}names": self.names}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str = "vocab_") -> "Vocabulary":
+        return cls(arrays[f"{prefix}product_ids"], arrays[f"{prefix}names"])
+
+class ItemsetTable:
+    """
+    Itemsets as offset/item arrays with optional float32 support and count columns
+
+    Counts are int64, or float64 for recency-weighted (fractional) counts.
+    """
+
+    def __init__(self, offsets: np.ndarray, items: np.ndarray,
+                 support: Optional[np.ndarray] = None, counts: Optional[np.ndarray] = None):
+        self.offsets = offsets
+        self.items = items
+        self.support = support
+        self.counts = counts
+
+    @classmethod
+    def from_itemsets(cls, itemsets: Iterable[Iterable[int]],
+                      support: Optional[Iterable[float]] = None,
+                      counts: Optional[Iterable[int]] = None) -> "ItemsetTable":
+        packed = _pack_itemsets(itemsets)
+        return cls(
+            packed["offsets"],
+            packed["items"],
+            None if support is None else np.asarray(list(support), dtype=np.float32),
+            None if counts is None else _count_array(list(counts))
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def itemset(self, i: int) -> np.ndarray:
+        return self.items[self.offsets[i]:self.offsets[i + 1]]
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        arrays = {f"{prefix}offsets": self.offsets, f"{prefix}items": self.items}
+        if self.support is not None:
+            arrays[f"{prefix}support"] = self.support
+        if self.counts is not None:
+            arrays[f"{prefix}counts"] = self.counts
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> "ItemsetTable":
+        return cls(
+            arrays[f"{prefix}offsets"],
+            arrays[f"{prefix}items"],
+            arrays.get(f"{prefix}support"),
+            arrays.get(f"{prefix}counts")
+        )
+
+class RuleTable:
+    """
+    Association rules as antecedent/consequent offset arrays with float32 metrics
+
+    Rows are stored sorted by (confidence, lift) descending, so a row number
+    is also the recommendation rank of the rule.
+    """
+
+    def __init__(self, antecedents: ItemsetTable, consequents: ItemsetTable,
+                 support: np.ndarray, confidence: np.ndarray, lift: np.ndarray):
+        self.antecedents = antecedents
+        self.consequents = consequents
+        self.support = support
+        self.confidence = confidence
+        self.lift = lift
+
+    @classmethod
+    def from_frame(cls, rules: pd.DataFrame, vocabulary: Vocabulary) -> "RuleTable":
+        """Build from an mlxtend rules frame whose itemsets hold product_ids"""
+        # Stable sort keeps the original rule order for ties
+        ordered = rules.sort_values(['confidence', 'lift'], ascending=False, kind='stable')
+
+        def to_items(itemset):
+            return [vocabulary.index_of(p) for p in itemset]
+
+        return cls(
+            ItemsetTable.from_itemsets(ordered['antecedents'].map(to_items)),
+            ItemsetTable.from_itemsets(ordered['consequents'].map(to_items)),
+            ordered['support'].to_numpy(dtype=np.float32),
+            ordered['confidence'].to_numpy(dtype=np.float32),
+            ordered['lift'].to_numpy(dtype=np.float32)
+        )
+
+    def __len__(self) -> int:
+        return len(self.confidence)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {}
+        arrays.update(self.antecedents.to_arrays("rule_antecedent_"))
+        arrays.update(self.consequents.to_arrays("rule_consequent_"))
+        arrays["rule_support"] = self.support
+        arrays["rule_confidence"] = self.confidence
+        arrays["rule_lift"] = self.lift
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "RuleTable":
+        return cls(
+            ItemsetTable.from_arrays(arrays, "rule_antecedent_"),
+            ItemsetTable.from_arrays(arrays, "rule_consequent_"),
+            arrays["rule_support"],
+            arrays["rule_confidence"],
+            arrays["rule_lift"]
+        )
+
+    def antecedent_index(self, n_items: int) -> Dict[str, np.ndarray]:
+        """
+        Inverted index item -> rule rows whose antecedents contain it
+
+        Rows within each item are ascending, i.e. best rule first.
+        """
+        rows = np.repeat(
+            np.arange(len(self), dtype=np.int32), self.antecedents.lengths
+        )
+        order = np.lexsort((rows, self.antecedents.items))
+        offsets = np.zeros(n_items + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.antecedents.items, minlength=n_items), out=offsets[1:])
+        return {"offsets": offsets, "rules": rows[order]}
+
+    def describe(self, row: int, vocabulary: Vocabulary) -> str:
+        """Human-readable form of a rule"""
+        antecedents = vocabulary.decode(self.antecedents.itemset(row))
+        consequents = vocabulary.decode(self.consequents.itemset(row))
+        return f"{antecedents} → {consequents}"
@@ -0,0 +1,136 @@
+"""
+Startup Warm-up Service
+"""
+
+import asyncio
+import io
+import time
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+# Each step imports its service, so only the selected services (and their
+# libraries) are loaded
+
+def _warm_revenue_prediction() -> bool:
+    from services.decision_tree_service import decision_tree_service
+    if not decision_tree_service.load_model():
+        return False
+    decision_tree_service.predict_revenue(datetime.now(), items_count=3)
+    return True
+
+def _warm_customer_segmentation() -> bool:
+    from services.decision_tree_service import customer_classification_service
+    if not customer_classification_service.load_model():
+        return False
+    customer_classification_service.predict(30, 3, 1000000)
+    return True
+
+def _warm_product_association() -> bool:
+    from services.apriori_service import apriori_service
+    if not apriori_service.load_model():
+        return False
+    if len(apriori_service.vocabulary):
+        apriori_service.get_recommendations([str(apriori_service.vocabulary.names[0])], top_n=5)
+    return True
+
+def _warm_product_classifier() -> bool:
+    from services.kmeans_service import kmeans_service
+    if not kmeans_service.load_model():
+        return False
+    kmeans_service.predict("Sữa tươi")
+    return True
+
+def _warm_image_classification() -> bool:
+    from PIL import Image
+    from services.image_service import image_service
+    
+    # classify_image trains a placeholder model when none exists; only warm a saved one
+    if not image_service.load_model():
+        return False
+    buffer = io.BytesIO()
+    Image.new('RGB', image_service.image_size).save(buffer, format='PNG')
+    image_service.classify_image(buffer.getvalue())
+    return True
+
+# Warm-up step per service, in run order
+WARMUP_STEPS: Dict[str, Callable[[], bool]] = {
+    "revenue_prediction": _warm_revenue_prediction,
+    "customer_segmentation": _warm_customer_segmentation,
+    "product_association": _warm_product_association,
+    "product_classifier": _warm_product_classifier,
+    "image_classification": _warm_image_classification,
+}
+
+class WarmupService:
+    """
+    Preloads models through model_loader and runs one synthetic inference per service
+
+    The app reports ready (/ready) once every selected step has finished.
+    A step whose model is not trained yet is skipped and a failing step is
+    recorded; neither holds readiness back, since neither would get better
+    by waiting.
+    """
+
+    def __init__(self, enabled: bool = True, models: Optional[List[str]] = None):
+        self.enabled = enabled
+        self.models = [name for name in (models or list(WARMUP_STEPS)) if name in WARMUP_STEPS]
+        self.status = "pending" if enabled else "disabled"
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("done", "disabled")
+
+    def run(self) -> Dict[str, Any]:
+        """Run the selected warm-up steps"""
+        if not self.enabled:
+            return self.state()
+
+        self.status = "running"
+        self.started_at = time.time()
+        for name in self.models:
+            start = time.perf_counter()
+            try:
+                status = "ready" if WARMUP_STEPS[name]() else "missing"
+                message = None if status == "ready" else "Model chưa được training"
+            except Exception as e:
+                status, message = "failed", str(e)
+            self.results[name] = {
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "message": message
+            }
+            print(f"🔥 Warm-up {name}: {status} ({self.results[name]['duration_ms']} ms)")
+
+        self.finished_at = time.time()
+        self.status = "done"
+        return self.state()
+
+    async def run_async(self) -> Dict[str, Any]:
+        """run() on a worker thread, so the app keeps serving /health and /ready meanwhile"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.run)
+
+    def state(self) -> Dict[str, Any]:
+        """Readiness and per-service warm-up results"""
+        duration = None
+        if self.started_at is not None:
+            duration = round((self.finished_at or time.time()) - self.started_at, 2)
+        return {
+            "ready": self.ready,
+            "status": self.status,
+            "duration_s": duration,
+            "models": self.results
+        }
+
+# Singleton instance
+warmup_service = WarmupService(
+    enabled=os.getenv("ML_WARMUP", "1") == "1",
+    models=[name.strip() for name in os.getenv("ML_WARMUP_MODELS", "").split(",") if name.strip()] or None
+)
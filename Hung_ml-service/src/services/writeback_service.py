@@ -0,0 +1,110 @@
+"""
+Write-back of model predictions to SQL tables
+"""
+
+from datetime import datetime
+from typing import Dict, Any, Optional
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from utils.database import db, Database
+from services.decision_tree_service import customer_classification_service
+from services.kmeans_service import kmeans_service
+from services.apriori_service import apriori_service
+
+# Target tables (see database/DB_SieuThi_Hung.sql)
+TABLE_CUSTOMER_SEGMENTS = "CustomerSegments"
+TABLE_PRODUCT_CLUSTERS = "ProductClusters"
+TABLE_PRODUCT_RECOMMENDATIONS = "ProductRecommendations"
+
+class PredictionWritebackService:
+    """Replaces the prediction tables with the current models' output, one transaction per table"""
+
+    def __init__(self, database: Database):
+        self.db = database
+
+    def write_customer_segments(self, updated_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """Customer segments -> CustomerSegments"""
+        result = customer_classification_service.segment_all_customers()
+        if not result['success']:
+            return result
+
+        updated_at = updated_at or datetime.now()
+        rows = (
+            (s['user_id'], str(s['segment']), s['rfm_score'], s['recency'],
+             s['frequency'], s['monetary'], updated_at)
+            for s in result['segments']
+        )
+        n_rows = self.db.bulk_insert(
+            TABLE_CUSTOMER_SEGMENTS,
+            ['user_id', 'segment', 'rfm_score', 'recency', 'frequency', 'monetary', 'updated_at'],
+            rows, replace=True
+        )
+        return {"success": True, "table": TABLE_CUSTOMER_SEGMENTS, "rows_written": n_rows}
+
+    def write_product_clusters(self, updated_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """Product clusters -> ProductClusters"""
+        result = kmeans_service.get_all_clusters()
+        if not result['success']:
+            return result
+
+        updated_at = updated_at or datetime.now()
+        rows = (
+            (int(product['id']), int(cluster_id), cluster['label'], updated_at)
+            for cluster_id, cluster in result['clusters'].items()
+            for product in cluster['products']
+        )
+        n_rows = self.db.bulk_insert(
+            TABLE_PRODUCT_CLUSTERS,
+            ['product_id', 'cluster', 'cluster_label', 'updated_at'],
+            rows, replace=True
+        )
+        return {"success": True, "table": TABLE_PRODUCT_CLUSTERS, "rows_written": n_rows}
+
+    def write_recommendations(self, updated_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """Each product's top-k recommendations -> ProductRecommendations"""
+        result = apriori_service.get_recommendation_table()
+        if not result['success']:
+            return result
+
+        updated_at = updated_at or datetime.now()
+        frame = result['recommendations']
+        rows = (
+            row + (updated_at,)
+            for row in zip(
+                frame['product_id'].tolist(), frame['rank'].tolist(),
+                frame['recommended_product_id'].tolist(), frame['confidence'].tolist(),
+                frame['lift'].tolist(), frame['support'].tolist()
+            )
+        )
+        n_rows = self.db.bulk_insert(
+            TABLE_PRODUCT_RECOMMENDATIONS,
+            ['product_id', 'rank', 'recommended_product_id', 'confidence', 'lift', 'support', 'updated_at'],
+            rows, replace=True
+        )
+        return {"success": True, "table": TABLE_PRODUCT_RECOMMENDATIONS, "rows_written": n_rows}
+
+    def write_all(self) -> Dict[str, Any]:
+        """Write every prediction table; one failing table does not stop the others"""
+        updated_at = datetime.now()
+        results = {}
+        for name, write in (
+            ("customer_segments", self.write_customer_segments),
+            ("product_clusters", self.write_product_clusters),
+            ("recommendations", self.write_recommendations),
+        ):
+            try:
+                results[name] = write(updated_at)
+            except Exception as e:
+                results[name] = {"success": False, "message": str(e)}
+
+        return {
+            "success": all(r['success'] for r in results.values()),
+            "updated_at": updated_at.isoformat(),
+            "results": results
+        }
+
+# Singleton instance
+writeback_service = PredictionWritebackService(db)
@@ -17,8 +17,8 @@ def main():
     print("="*60)
     
     try:
-        # Force retrain
-        result = apriori_service.train(retrain=True)
+        # Force retrain and serve the result
+        result = apriori_service.train_and_activate(retrain=True)
         
         if result['success']:
             print("\n✅ TRAINING THÀNH CÔNG!")
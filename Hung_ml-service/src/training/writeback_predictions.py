@@ -0,0 +1,39 @@
+"""
+Write model predictions back to SQL tables (CustomerSegments, ProductClusters, ProductRecommendations)
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from services.writeback_service import writeback_service
+
+def main():
+    """Replace the prediction tables with the current models' output"""
+    print("="*60)
+    print("WRITE-BACK PREDICTIONS TO DATABASE")
+    print("="*60)
+
+    try:
+        result = writeback_service.write_all()
+
+        for name, table_result in result['results'].items():
+            if table_result['success']:
+                print(f"✅ {table_result['table']}: {table_result['rows_written']} dòng")
+            else:
+                print(f"❌ {name}: {table_result.get('message', 'Unknown error')}")
+
+        if not result['success']:
+            return 1
+
+    except Exception as e:
+        print(f"\n❌ LỖI: {str(e)}")
+        return 1
+
+    print("\n" + "="*60)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,80 @@
+"""
+Columnar query results built straight from cursor rows
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Sequence, Iterable
+
+# String columns stored as int32 codes into a per-column dictionary
+DICTIONARY_COLUMNS = ("product_name", "category_name")
+
+def _to_array(values: Sequence) -> np.ndarray:
+    """Typed array for one column of one batch (NULL -> NaN/NaT when the type allows)"""
+    sample = next((v for v in values if v is not None), None)
+    has_null = any(v is None for v in values)
+
+    if isinstance(sample, bool):
+        return np.array(values, dtype=object if has_null else bool)
+    if isinstance(sample, int):
+        if not has_null:
+            return np.array(values, dtype=np.int64)
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if isinstance(sample, (float, Decimal)):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if isinstance(sample, (datetime, date)):
+        return np.array(values, dtype='datetime64[ns]')
+    return np.array(values, dtype=object)
+
+class ColumnarResult:
+    """Query result as one NumPy array per column, dictionary-encoded where configured"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], dictionaries: Dict[str, np.ndarray]):
+        self.columns = columns
+        self.dictionaries = dictionaries  # column -> values; the column holds codes (-1 = NULL)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame sharing the arrays; dictionary columns become Categoricals"""
+        data = {}
+        for name, values in self.columns.items():
+            if name in self.dictionaries:
+                data[name] = pd.Categorical.from_codes(values, categories=self.dictionaries[name])
+            else:
+                data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+class ColumnBuilder:
+    """Accumulates tuple rows batch by batch into typed column chunks"""
+
+    def __init__(self, names: List[str], dictionary_columns: Iterable[str] = DICTIONARY_COLUMNS):
+        self.names = names
+        self.chunks: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        self.lookups: Dict[str, Dict[str, int]] = {
+            name: {} for name in names if name in set(dictionary_columns)
+        }
+
+    def append(self, rows: List[tuple]):
+        for name, values in zip(self.names, zip(*rows)):
+            lookup = self.lookups.get(name)
+            if lookup is None:
+                self.chunks[name].append(_to_array(values))
+            else:
+                codes = [-1 if v is None else lookup.setdefault(v, len(lookup)) for v in values]
+                self.chunks[name].append(np.array(codes, dtype=np.int32))
+
+    def finish(self) -> ColumnarResult:
+        columns = {}
+        for name, chunks in self.chunks.items():
+            if chunks:
+                columns[name] = np.concatenate(chunks)
+            else:
+                columns[name] = np.empty(0, dtype=np.int32 if name in self.lookups else object)
+        dictionaries = {
+            name: np.array(list(lookup), dtype=object) for name, lookup in self.lookups.items()
+        }
+        return ColumnarResult(columns, dictionaries)
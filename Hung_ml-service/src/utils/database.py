@@ -2,10 +2,156 @@
 Database connection utilities for SQL Server
 """
 
+import asyncio
+import functools
 import pymssql
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Dict, List, Any, Optional
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Callable, Iterable
+
+from utils.columnar import ColumnBuilder, ColumnarResult, DICTIONARY_COLUMNS
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of database connections
+    
+    At most `max_size` connections exist at once; callers beyond that wait
+    up to `timeout` seconds. Idle connections are pinged on checkout and
+    replaced when the ping fails or they are older than `max_age` seconds.
+    """
+    
+    def __init__(self, connect: Callable[[], Any], max_size: int = 5,
+                 max_age: float = 1800, timeout: float = 30,
+                 ping_query: str = "SELECT 1"):
+        self.connect = connect
+        self.max_size = max_size
+        self.max_age = max_age
+        self.timeout = timeout
+        self.ping_query = ping_query
+        
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle: deque = deque()  # (connection, created_at), most recently used last
+        self._created_at: Dict[int, float] = {}
+        
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._opened = 0
+        self._recycled = 0
+        self._failed_pings = 0
+    
+    def acquire(self):
+        """Check out a healthy connection, opening one if none is idle"""
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(
+                f"Hết thời gian chờ kết nối database ({self.timeout}s, pool size {self.max_size})"
+            )
+        waited = time.perf_counter() - start
+        
+        try:
+            conn = self._take_idle()
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            self._slots.release()
+            raise
+        
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+    
+    def release(self, conn, discard: bool = False):
+        """Return a connection; broken or expired connections are closed instead"""
+        try:
+            if discard or self._expired(conn):
+                self._close(conn, recycled=not discard)
+            else:
+                with self._lock:
+                    self._idle.append(conn)
+        finally:
+            self._slots.release()
+    
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            self._close(conn)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Pool size and wait-time metrics"""
+        with self._lock:
+            n_open = len(self._created_at)
+            n_idle = len(self._idle)
+            return {
+                "max_size": self.max_size,
+                "open": n_open,
+                "idle": n_idle,
+                "in_use": n_open - n_idle,
+                "checkouts": self._checkouts,
+                "avg_wait_ms": round(1000 * self._wait_total / self._checkouts, 3) if self._checkouts else 0.0,
+                "max_wait_ms": round(1000 * self._wait_max, 3),
+                "opened": self._opened,
+                "recycled": self._recycled,
+                "failed_pings": self._failed_pings
+            }
+    
+    def _take_idle(self):
+        """Most recently used idle connection that is still young and answers a ping"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn = self._idle.pop()
+            
+            if self._expired(conn):
+                self._close(conn, recycled=True)
+            elif not self._ping(conn):
+                with self._lock:
+                    self._failed_pings += 1
+                self._close(conn)
+            else:
+                return conn
+    
+    def _open(self):
+        conn = self.connect()
+        with self._lock:
+            self._created_at[id(conn)] = time.monotonic()
+            self._opened += 1
+        return conn
+    
+    def _close(self, conn, recycled: bool = False):
+        with self._lock:
+            self._created_at.pop(id(conn), None)
+            if recycled:
+                self._recycled += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+    
+    def _expired(self, conn) -> bool:
+        created_at = self._created_at.get(id(conn))
+        return created_at is None or time.monotonic() - created_at > self.max_age
+    
+    def _ping(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.ping_query)
+            cursor.fetchall()
+            return True
+        except Exception:
+            return False
 
 class Database:
     """SQL Server database connection manager"""
@@ -16,27 +162,80 @@ class Database:
         self.database = os.getenv("DB_NAME", "SieuThiABC")
         self.user = os.getenv("DB_USER", "sa")
         self.password = os.getenv("DB_PASSWORD", "13032004Nghi@")
+        self.pool = ConnectionPool(
+            self._connect,
+            max_size=int(os.getenv("DB_POOL_SIZE", 5)),
+            max_age=float(os.getenv("DB_POOL_MAX_AGE", 1800)),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", 30))
+        )
+        self.fetch_batch_size = int(os.getenv("DB_FETCH_BATCH_SIZE", 5000))
+        self.write_batch_size = int(os.getenv("DB_WRITE_BATCH_SIZE", 1000))
+        # Blocking database work awaited from async handlers runs here, never
+        # on the event loop; sized like the pool so queued calls wait here
+        # instead of holding a thread while blocked on a connection
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("DB_EXECUTOR_WORKERS", self.pool.max_size)),
+            thread_name_prefix="db"
+        )
+    
+    def _connect(self):
+        """Open a new SQL Server connection"""
+        return pymssql.connect(  # type: ignore
+            server=self.host,
+            port=self.port,
+            database=self.database,
+            user=self.user,
+            password=self.password,
+            as_dict=True,
+            # bulk_insert(replace=True) relies on DELETE + INSERT committing together
+            autocommit=False
+        )
     
     @contextmanager
     def get_connection(self):
-        """Get database connection with context manager"""
-        conn = None
+        """Get a pooled database connection with context manager"""
+        try:
+            conn = self.pool.acquire()
+        except Exception as e:
+            print(f"Database connection error: {e}")
+            raise
+        
+        discard = False
         try:
-            conn = pymssql.connect(  # type: ignore
-                server=self.host,
-                port=self.port,
-                database=self.database,
-                user=self.user,
-                password=self.password,
-                as_dict=True
-            )
             yield conn
         except Exception as e:
             print(f"Database connection error: {e}")
+            # Undo the failed work; a connection that cannot roll back is dropped
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
             raise
         finally:
-            if conn:
-                conn.close()
+            self.pool.release(conn, discard=discard)
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool metrics"""
+        return self.pool.stats()
+    
+    def close(self):
+        """Close idle connections and stop the async executor"""
+        self.executor.shutdown(wait=False)
+        self.pool.close_all()
+    
+    async def run_async(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Await a blocking database call on the bounded DB executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+    
+    async def execute_query_async(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """Async execute_query"""
+        return await self.run_async(self.execute_query, query, params)
+    
+    async def query_columns_async(self, query: str, params: Optional[tuple] = None,
+                                  dictionary_columns: Iterable[str] = DICTIONARY_COLUMNS) -> ColumnarResult:
+        """Async query_columns"""
+        return await self.run_async(self.query_columns, query, params, dictionary_columns)
     
     def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
         """Execute SELECT query and return results"""
@@ -46,6 +245,28 @@ class Database:
             results = cursor.fetchall()
             return results
     
+    def query_columns(self, query: str, params: Optional[tuple] = None,
+                      dictionary_columns: Iterable[str] = DICTIONARY_COLUMNS,
+                      batch_size: Optional[int] = None) -> ColumnarResult:
+        """
+        Execute SELECT query and return typed NumPy columns
+        
+        Rows are fetched as tuples in batches and appended to column chunks,
+        so no per-row dicts are built; strings in `dictionary_columns` are
+        stored as int32 codes.
+        """
+        batch_size = batch_size or self.fetch_batch_size
+        with self.get_connection() as conn:
+            cursor = conn.cursor(as_dict=False)
+            cursor.execute(query, params or ())
+            builder = ColumnBuilder([column[0] for column in cursor.description], dictionary_columns)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                builder.append(rows)
+        return builder.finish()
+    
     def execute_non_query(self, query: str, params: Optional[tuple] = None) -> int:
         """Execute INSERT/UPDATE/DELETE query"""
         with self.get_connection() as conn:
@@ -54,27 +275,95 @@ class Database:
             conn.commit()
             return cursor.rowcount
     
+    def execute_many(self, query: str, rows: Iterable[tuple]) -> int:
+        """Execute one parameterized statement for every row, in a single transaction"""
+        rows = list(rows)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(query, rows)
+            conn.commit()
+        return len(rows)
+    
+    def bulk_insert(self, table: str, columns: List[str], rows: Iterable[tuple],
+                    replace: bool = False, batch_size: Optional[int] = None) -> int:
+        """
+        Insert rows with multi-row INSERT ... VALUES statements, in a single transaction
+        
+        Each statement carries up to batch_size rows (capped by SQL Server's
+        1000 rows / 2100 parameters per statement), so a write costs a round
+        trip per batch instead of per row. With replace=True the table is
+        emptied first in the same transaction, so readers see either the old
+        rows or the new ones. `table` and `columns` are trusted identifiers.
+        """
+        rows_per_statement = min(batch_size or self.write_batch_size, 1000, 2099 // len(columns))
+        row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        prefix = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+        
+        n_rows = 0
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if replace:
+                cursor.execute(f"DELETE FROM {table}", ())
+            batch: List[tuple] = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == rows_per_statement:
+                    n_rows += self._insert_batch(cursor, prefix, row_placeholder, batch)
+                    batch = []
+            if batch:
+                n_rows += self._insert_batch(cursor, prefix, row_placeholder, batch)
+            conn.commit()
+        return n_rows
+    
+    def _insert_batch(self, cursor, prefix: str, row_placeholder: str, batch: List[tuple]) -> int:
+        query = prefix + ", ".join([row_placeholder] * len(batch))
+        cursor.execute(query, tuple(value for row in batch for value in row))
+        return len(batch)
+    
     def get_customers_data(self) -> List[Dict[str, Any]]:
         """Get customer data for segmentation"""
-        query = """
+        return self.execute_query(self._customers_query())
+    
+    def get_customers_columns(self) -> ColumnarResult:
+        """Customer data for segmentation, as columns"""
+        return self.query_columns(self._customers_query())
+    
+    # SQL dialect hooks (T-SQL); SQLiteDatabase overrides them
+    def _sql_days_since(self, expr: str) -> str:
+        return f"DATEDIFF(day, {expr}, GETDATE())"
+    
+    def _sql_datepart(self, part: str, expr: str) -> str:
+        return f"DATEPART({part}, {expr})"
+    
+    def _sql_date(self, expr: str) -> str:
+        return f"CAST({expr} AS DATE)"
+    
+    def _customers_query(self) -> str:
+        return f"""
             SELECT 
                 u.id as user_id,
                 COUNT(DISTINCT o.id) as total_orders,
                 SUM(o.total) as total_spent,
                 AVG(o.total) as avg_order_value,
-                DATEDIFF(day, MAX(o.created_at), GETDATE()) as days_since_last_order,
-                COUNT(DISTINCT YEAR(o.created_at)) as years_active
+                {self._sql_days_since('MAX(o.created_at)')} as days_since_last_order,
+                COUNT(DISTINCT {self._sql_datepart('year', 'o.created_at')}) as years_active
             FROM Users u
             LEFT JOIN Orders o ON u.id = o.user_id AND o.order_status = 'delivered'
             WHERE u.role = 'customer'
             GROUP BY u.id
             HAVING COUNT(o.id) > 0
         """
-        return self.execute_query(query)
     
     def get_orders_data(self) -> List[Dict[str, Any]]:
         """Get orders data for revenue prediction"""
-        query = """
+        return self.execute_query(*self._orders_query())
+    
+    def get_orders_columns(self, since_order_id: Optional[int] = None) -> ColumnarResult:
+        """Orders data for revenue prediction, as columns (optionally only orders after since_order_id)"""
+        return self.query_columns(*self._orders_query(since_order_id))
+    
+    def _orders_query(self, since_order_id: Optional[int] = None) -> tuple:
+        query = f"""
             SELECT 
                 o.id,
                 o.user_id,
@@ -85,22 +374,119 @@ class Database:
                 o.payment_method,
                 o.order_status,
                 o.created_at,
-                DATEPART(year, o.created_at) as year,
-                DATEPART(month, o.created_at) as month,
-                DATEPART(day, o.created_at) as day,
-                DATEPART(weekday, o.created_at) as weekday,
+                {self._sql_datepart('year', 'o.created_at')} as year,
+                {self._sql_datepart('month', 'o.created_at')} as month,
+                {self._sql_datepart('day', 'o.created_at')} as day,
+                {self._sql_datepart('weekday', 'o.created_at')} as weekday,
                 COUNT(oi.id) as items_count
             FROM Orders o
             LEFT JOIN OrderItems oi ON o.id = oi.order_id
             WHERE o.order_status = 'delivered'
+        """
+        params = []
+        if since_order_id is not None:
+            query += " AND o.id > %s"
+            params.append(since_order_id)
+        query += """
             GROUP BY o.id, o.user_id, o.total, o.subtotal, o.discount, 
                      o.shipping_fee, o.payment_method, o.order_status, o.created_at
             ORDER BY o.created_at DESC
         """
-        return self.execute_query(query)
+        return query, tuple(params)
     
-    def get_transactions_data(self) -> List[Dict[str, Any]]:
-        """Get transaction data for Apriori algorithm"""
+    def get_order_features_columns(self) -> ColumnarResult:
+        """
+        Revenue model features per delivered order, aggregated in SQL
+        
+        The 7/30-day average-order features are calendar-day windows and
+        are added by DecisionTreeService.prepare_data.
+        """
+        return self.query_columns(f"""
+            SELECT 
+                o.id,
+                o.created_at,
+                {self._sql_datepart('month', 'o.created_at')} as month,
+                {self._sql_datepart('weekday', 'o.created_at')} as weekday,
+                COUNT(oi.id) as items_count,
+                CAST(o.total AS FLOAT) as total
+            FROM Orders o
+            LEFT JOIN OrderItems oi ON o.id = oi.order_id
+            WHERE o.order_status = 'delivered'
+            GROUP BY o.id, o.created_at, o.total
+            ORDER BY o.created_at, o.id
+        """)
+    
+    def get_daily_revenue_columns(self, since_date: Optional[datetime] = None) -> ColumnarResult:
+        """
+        Delivered revenue and order count per day, aggregated in SQL
+        
+        Only days with orders are returned; DailyRevenueSeries fills the
+        gaps with zeros and computes the 7/30-day windows. With since_date
+        only the days from then on are aggregated.
+        """
+        day = self._sql_date('o.created_at')
+        query = """
+            SELECT 
+                {day} as day,
+                COUNT(o.id) as n_orders,
+                SUM(CAST(o.total AS FLOAT)) as revenue
+            FROM Orders o
+            WHERE o.order_status = 'delivered'
+        """.format(day=day)
+        params = []
+        if since_date is not None:
+            query += " AND o.created_at >= %s"
+            params.append(since_date)
+        query += f" GROUP BY {day} ORDER BY {day}"
+        return self.query_columns(query, tuple(params))
+    
+    def get_customer_rfm_columns(self) -> ColumnarResult:
+        """
+        Recency / frequency / monetary and their 1-5 scores per customer, computed in SQL
+        
+        Thresholds and the combined score match helpers.calculate_rfm_score.
+        """
+        return self.query_columns(f"""
+            WITH rfm AS (
+                SELECT 
+                    u.id as user_id,
+                    {self._sql_days_since('MAX(o.created_at)')} as recency,
+                    COUNT(DISTINCT o.id) as frequency,
+                    CAST(SUM(o.total) AS FLOAT) as monetary
+                FROM Users u
+                JOIN Orders o ON u.id = o.user_id AND o.order_status = 'delivered'
+                WHERE u.role = 'customer'
+                GROUP BY u.id
+            ),
+            scored AS (
+                SELECT 
+                    user_id, recency, frequency, monetary,
+                    CASE WHEN recency <= 30 THEN 5 WHEN recency <= 60 THEN 4
+                         WHEN recency <= 90 THEN 3 WHEN recency <= 180 THEN 2 ELSE 1 END as r_score,
+                    CASE WHEN frequency >= 10 THEN 5 WHEN frequency >= 7 THEN 4
+                         WHEN frequency >= 4 THEN 3 WHEN frequency >= 2 THEN 2 ELSE 1 END as f_score,
+                    CASE WHEN monetary >= 5000000 THEN 5 WHEN monetary >= 3000000 THEN 4
+                         WHEN monetary >= 1000000 THEN 3 WHEN monetary >= 500000 THEN 2 ELSE 1 END as m_score
+                FROM rfm
+            )
+            SELECT 
+                user_id, recency, frequency, monetary, r_score, f_score, m_score,
+                (r_score + f_score + m_score) / 3 as rfm_score
+            FROM scored
+        """)
+    
+    def get_transactions_data(self, since_order_id: Optional[int] = None,
+                              since_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Get transaction data for Apriori algorithm (optionally only orders after since_order_id / since_date)"""
+        return self.execute_query(*self._transactions_query(since_order_id, since_date))
+    
+    def get_transactions_columns(self, since_order_id: Optional[int] = None,
+                                 since_date: Optional[datetime] = None) -> ColumnarResult:
+        """Transaction data for Apriori algorithm, as columns"""
+        return self.query_columns(*self._transactions_query(since_order_id, since_date))
+    
+    def _transactions_query(self, since_order_id: Optional[int],
+                            since_date: Optional[datetime]) -> tuple:
         query = """
             SELECT 
                 o.id as order_id,
@@ -112,13 +498,27 @@ class Database:
             JOIN OrderItems oi ON o.id = oi.order_id
             JOIN Products p ON oi.product_id = p.id
             WHERE o.order_status = 'delivered'
-            ORDER BY o.id
         """
-        return self.execute_query(query)
+        params = []
+        if since_order_id is not None:
+            query += " AND o.id > %s"
+            params.append(since_order_id)
+        if since_date is not None:
+            query += " AND o.created_at >= %s"
+            params.append(since_date)
+        query += " ORDER BY o.id"
+        return query, tuple(params)
     
     def get_products_data(self) -> List[Dict[str, Any]]:
         """Get products data"""
-        query = """
+        return self.execute_query(self._products_query())
+    
+    def get_products_columns(self) -> ColumnarResult:
+        """Products data, as columns"""
+        return self.query_columns(self._products_query())
+    
+    def _products_query(self) -> str:
+        return """
             SELECT 
                 p.id,
                 p.name,
@@ -135,7 +535,30 @@ class Database:
             LEFT JOIN Categories c ON p.category_id = c.id
             WHERE p.status = 'active'
         """
-        return self.execute_query(query)
 
-# Singleton instance
-db = Database()
+def create_database() -> Database:
+    """Database selected by DB_ENGINE: "mssql" (default) or "sqlite" (local stand-in)"""
+    if os.getenv("DB_ENGINE", "mssql") == "sqlite":
+        from utils.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(os.getenv("DB_SQLITE_PATH", "sieuthi.db"))
+    return Database()
+
+# Singleton instance, created on first access: with DB_ENGINE=sqlite
+# create_database() imports utils.sqlite_database, which imports this module
+_db: Optional[Database] = None
+_db_lock = threading.Lock()
+
+def get_database() -> Database:
+    """The shared Database, created on first call"""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = create_database()
+    return _db
+
+def __getattr__(name: str) -> Any:
+    # `from utils.database import db` resolves here
+    if name == "db":
+        return get_database()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
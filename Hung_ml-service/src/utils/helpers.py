@@ -92,6 +92,15 @@ def get_date_features(date: datetime) -> Dict[str, int]:
         "is_weekend": 1 if date.weekday() >= 5 else 0
     }
 
+def get_date_feature_arrays(dates) -> Dict[str, np.ndarray]:
+    """Month and weekday (Monday = 0) of an array of dates, as get_date_features"""
+    days = np.asarray(dates, dtype='datetime64[D]')
+    return {
+        "month": days.astype('datetime64[M]').astype(np.int64) % 12 + 1,
+        # 1970-01-01 was a Thursday
+        "weekday": (days.astype(np.int64) + 3) % 7
+    }
+
 def parse_images(images_json: str) -> List[str]:
     """Parse images JSON string"""
     try:
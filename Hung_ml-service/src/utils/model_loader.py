@@ -3,15 +3,156 @@ Model loader utilities
 """
 
 import pickle
-import joblib
+import numpy as np
+import pandas as pd
 import os
+import shutil
+import struct
+import sys
+import threading
+import time
+import zipfile
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# File formats a model can be stored in
+MODEL_EXTENSIONS = (".pkl", ".npz")
+
+# File in a model's directory naming its current version
+CURRENT_POINTER = "CURRENT"
+
+# Directory of alias files, each naming the model an alias stands for
+ALIAS_DIR = "aliases"
+
+def estimate_size(obj: Any) -> Tuple[int, int]:
+    """
+    Approximate (heap bytes, memory-mapped bytes) held by a loaded model
+    
+    Walks arrays, frames, containers and object attributes. Memory-mapped
+    arrays are counted separately: their pages belong to the page cache and
+    are shared by every process mapping the same file.
+    """
+    sizes = [0, 0]
+    seen = set()
+    
+    def walk(value: Any):
+        if id(value) in seen:
+            return
+        seen.add(id(value))
+        
+        if isinstance(value, np.ndarray):
+            sizes[1 if isinstance(value, np.memmap) else 0] += value.nbytes
+        elif isinstance(value, (pd.DataFrame, pd.Series)):
+            sizes[0] += int(np.sum(value.memory_usage(index=True, deep=True)))
+        elif isinstance(value, (str, bytes, int, float, bool, type(None))):
+            sizes[0] += sys.getsizeof(value)
+        elif isinstance(value, dict):
+            sizes[0] += sys.getsizeof(value)
+            for k, v in value.items():
+                walk(k)
+                walk(v)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            sizes[0] += sys.getsizeof(value)
+            for v in value:
+                walk(v)
+        else:
+            sizes[0] += sys.getsizeof(value)
+            state = getattr(value, '__dict__', None)
+            if state is None and type(value).__module__.startswith('sklearn'):
+                # Cython parts of estimators (e.g. tree_) keep their arrays in the pickled state
+                state = value.__getstate__()
+            if isinstance(state, dict):
+                walk(state)
+    
+    walk(obj)
+    return sizes[0], sizes[1]
+
+def map_npz(model_path: Path) -> Dict[str, np.ndarray]:
+    """
+    Memory-map the arrays of an uncompressed .npz (as written by np.savez), read-only
+    
+    np.load ignores mmap_mode for .npz archives, but np.savez stores each
+    .npy member uncompressed, so every array can be mapped at its offset
+    in the archive. 0-d arrays (scalar settings) are copied.
+    """
+    arrays = {}
+    with zipfile.ZipFile(model_path) as archive, open(model_path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed and cannot be memory-mapped")
+            
+            # Local file header: 30 fixed bytes, then the file name and extra field
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"{info.filename} holds Python objects and cannot be memory-mapped")
+            
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            order = 'F' if fortran_order else 'C'
+            if shape == () or 0 in shape:
+                array = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape, order=order)
+            else:
+                array = np.memmap(model_path, dtype=dtype, mode='r', shape=shape,
+                                  order=order, offset=f.tell())
+            arrays[name] = array
+    return arrays
+
+class _CachedModel:
+    """A loaded model plus the file version it was loaded from"""
+    
+    def __init__(self, value: Any, version: Tuple[int, int], path: Path, name: str):
+        self.value = value
+        self.version = version  # (mtime_ns, size) of the file
+        self.path = path
+        self.name = name
+        self.memory_bytes, self.mapped_bytes = estimate_size(value)
+        self.loaded_at = time.time()
+        self.hits = 0
+
+def _fsync_dir(directory: Path):
+    """Make a rename in `directory` durable (not possible on Windows)"""
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 class ModelLoader:
-    """Load and save ML models"""
+    """
+    Load and save ML models as versions, keeping loaded models in an in-process registry
     
-    def __init__(self, models_dir: str = None):
+    Each model has a directory models/<name>/ of immutable version files
+    (v<timestamp>.pkl / .npz) and a CURRENT file naming the version in use.
+    A save writes a temp file, fsyncs it and renames it into place, then
+    swaps CURRENT the same way, so readers only ever see a complete version.
+    The newest `keep_versions` versions before the current one are kept for
+    rollback(). Models saved before versioning (models/<name>.pkl) are still
+    read while no version exists.
+    
+    Loaded models are cached by file and reused until the file's mtime or
+    size changes, so every caller shares one object per model version and a
+    service can tell a new version was saved (by any process) when
+    load_model returns a different object. Concurrent loads of the same
+    file are coalesced: one thread reads it while the others wait for its
+    result. Cached models are shared and must be treated as read-only.
+    
+    With mmap=True numeric arrays are memory-mapped from the model files
+    instead of read into each process (joblib mmap_mode='r' for .pkl, the
+    stored .npy members for .npz), so uvicorn workers loading the same
+    file share its physical pages.
+    """
+    
+    def __init__(self, models_dir: str = None, mmap: bool = False, keep_versions: int = 3):
         if models_dir is None:
             # Default to models directory in project root
             base_dir = Path(__file__).parent.parent.parent
@@ -19,35 +160,44 @@ class ModelLoader:
         
         self.models_dir = Path(models_dir)
         self.models_dir.mkdir(parents=True, exist_ok=True)
+        self.mmap = mmap
+        self.keep_versions = keep_versions
+        
+        self._lock = threading.Lock()
+        self._cache: Dict[Path, _CachedModel] = {}
+        self._loading: Dict[Path, threading.Event] = {}
+        # pointer file -> ((inode, mtime_ns) of the file, text it holds)
+        self._pointers: Dict[Path, Tuple[Tuple[int, int], str]] = {}
+        self.hits = 0
+        self.misses = 0
     
     def save_model(self, model: Any, model_name: str, use_joblib: bool = True):
-        """Save model to file"""
-        model_path = self.models_dir / f"{model_name}.pkl"
-        
-        try:
+        """Save model as a new current version (joblib files are uncompressed so their arrays can be memory-mapped)"""
+        def write(path: Path):
             if use_joblib:
-                joblib.dump(model, model_path)
+                import joblib
+                joblib.dump(model, path, compress=0)
             else:
-                with open(model_path, 'wb') as f:
+                with open(path, 'wb') as f:
                     pickle.dump(model, f)
-            
-            print(f"✅ Model saved: {model_path}")
-            return str(model_path)
-        except Exception as e:
-            print(f"❌ Error saving model: {e}")
-            raise
+        
+        return self._save_version(model_name, ".pkl", write, model)
     
     def load_model(self, model_name: str, use_joblib: bool = True) -> Optional[Any]:
-        """Load model from file"""
-        model_path = self.models_dir / f"{model_name}.pkl"
+        """Load the current version of a model"""
+        model_path = self._model_path(model_name, ".pkl")
         
-        if not model_path.exists():
-            print(f"⚠️  Model not found: {model_path}")
+        if model_path is None:
+            print(f"⚠️  Model not found: {model_name}")
             return None
         
+        return self._cached_load(model_name, model_path, lambda path: self._read_model(path, use_joblib))
+    
+    def _read_model(self, model_path: Path, use_joblib: bool) -> Optional[Any]:
         try:
             if use_joblib:
-                model = joblib.load(model_path)
+                import joblib
+                model = joblib.load(model_path, mmap_mode='r' if self.mmap else None)
             else:
                 with open(model_path, 'rb') as f:
                     model = pickle.load(f)
@@ -58,27 +208,317 @@ class ModelLoader:
             print(f"❌ Error loading model: {e}")
             return None
     
+    def save_arrays(self, arrays: Dict[str, np.ndarray], model_name: str) -> str:
+        """Save a dict of numpy arrays as a new current version (uncompressed .npz)"""
+        return self._save_version(model_name, ".npz", lambda path: np.savez(path, **arrays), arrays)
+    
+    def load_arrays(self, model_name: str) -> Optional[Dict[str, np.ndarray]]:
+        """Load the current version of a model saved with save_arrays"""
+        model_path = self._model_path(model_name, ".npz")
+        
+        if model_path is None:
+            return None
+        
+        return self._cached_load(model_name, model_path, self._read_arrays)
+    
+    def _read_arrays(self, model_path: Path) -> Optional[Dict[str, np.ndarray]]:
+        try:
+            if self.mmap:
+                arrays = map_npz(model_path)
+            else:
+                with np.load(model_path, allow_pickle=False) as data:
+                    arrays = {key: data[key] for key in data.files}
+            for array in arrays.values():
+                # Shared through the cache: catch accidental in-place updates
+                array.flags.writeable = False
+            
+            print(f"✅ Model loaded: {model_path}")
+            return arrays
+        except Exception as e:
+            print(f"❌ Error loading model: {e}")
+            return None
+    
+    def _save_version(self, model_name: str, ext: str, write: Callable[[Path], None], value: Any) -> str:
+        """Write a new version file atomically, point CURRENT at it and prune old versions"""
+        model_dir = self.models_dir / model_name
+        version = datetime.now().strftime("v%Y%m%d-%H%M%S-%f")
+        model_path = model_dir / f"{version}{ext}"
+        # Ends with ext: np.savez appends .npz to any other name
+        tmp_path = model_dir / f".{version}.{os.getpid()}.tmp{ext}"
+        
+        try:
+            model_dir.mkdir(parents=True, exist_ok=True)
+            write(tmp_path)
+            with open(tmp_path, 'rb+') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, model_path)
+            _fsync_dir(model_dir)
+            
+            # The saved object is this version: cache it so the saving process
+            # does not read it straight back
+            stat = model_path.stat()
+            # Sized outside the lock: estimate_size walks the whole model
+            entry = _CachedModel(value, (stat.st_mtime_ns, stat.st_size), model_path, model_name)
+            with self._lock:
+                self._cache[model_path] = entry
+                self._evict_other_versions(model_name, model_path)
+            self._set_current(model_name, model_path.name)
+            self._prune(model_name)
+            
+            print(f"✅ Model saved: {model_path}")
+            return str(model_path)
+        except Exception as e:
+            print(f"❌ Error saving model: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+    
+    def _write_pointer(self, pointer: Path, text: str):
+        """Atomically replace a pointer file"""
+        tmp_path = pointer.parent / f".{pointer.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, pointer)
+        _fsync_dir(pointer.parent)
+    
+    def _read_pointer(self, pointer: Path) -> Optional[str]:
+        """Text of a pointer file, re-read only when the file was replaced"""
+        try:
+            stat = pointer.stat()
+        except FileNotFoundError:
+            return None
+        
+        key = (stat.st_ino, stat.st_mtime_ns)
+        cached = self._pointers.get(pointer)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
+        text = pointer.read_text().strip()
+        self._pointers[pointer] = (key, text)
+        return text
+    
+    def _set_current(self, model_name: str, version_file: str):
+        """Atomically replace the CURRENT pointer"""
+        self._write_pointer(self.models_dir / model_name / CURRENT_POINTER, version_file)
+    
+    def current_version(self, model_name: str) -> Optional[str]:
+        """File name of the current version (None for unversioned or missing models)"""
+        return self._read_pointer(self.models_dir / model_name / CURRENT_POINTER)
+    
+    def set_alias(self, alias: str, model_name: str):
+        """
+        Point an alias at a model, e.g. the variant a service serves
+        
+        Like CURRENT, the alias is a file replaced atomically, so every
+        process resolving it switches to the new model on its next request.
+        """
+        alias_dir = self.models_dir / ALIAS_DIR
+        alias_dir.mkdir(parents=True, exist_ok=True)
+        self._write_pointer(alias_dir / alias, model_name)
+    
+    def resolve_alias(self, alias: str) -> Optional[str]:
+        """Model name an alias points at (None if it was never set)"""
+        return self._read_pointer(self.models_dir / ALIAS_DIR / alias)
+    
+    def _model_path(self, model_name: str, ext: str) -> Optional[Path]:
+        """Current version file with this extension, else a pre-versioning file"""
+        version_file = self.current_version(model_name)
+        if version_file is not None:
+            return self.models_dir / model_name / version_file if version_file.endswith(ext) else None
+        
+        legacy_path = self.models_dir / f"{model_name}{ext}"
+        return legacy_path if legacy_path.exists() else None
+    
+    def versions(self, model_name: str) -> List[Dict[str, Any]]:
+        """Saved versions of a model, oldest first"""
+        model_dir = self.models_dir / model_name
+        if not model_dir.is_dir():
+            return []
+        
+        current = self.current_version(model_name)
+        result = []
+        for path in sorted(model_dir.glob("v*")):
+            if path.suffix not in MODEL_EXTENSIONS:
+                continue
+            stat = path.stat()
+            result.append({
+                "version": path.stem,
+                "file": path.name,
+                "size_bytes": stat.st_size,
+                "saved_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                "current": path.name == current
+            })
+        return result
+    
+    def rollback(self, model_name: str, version: Optional[str] = None) -> Optional[str]:
+        """
+        Point CURRENT at an earlier version (the one before the current by default)
+        
+        Only the pointer changes, so services swap to it on their next request.
+        Returns the version now current, or None if there is nothing to roll back to.
+        """
+        files = [v['file'] for v in self.versions(model_name)]
+        current = self.current_version(model_name)
+        
+        if version is not None:
+            target = next((f for f in files if Path(f).stem == version), None)
+        else:
+            earlier = [f for f in files if current is None or f < current]
+            target = earlier[-1] if earlier else None
+        
+        if target is None:
+            return None
+        
+        self._set_current(model_name, target)
+        with self._lock:
+            self._evict_other_versions(model_name, self.models_dir / model_name / target)
+        print(f"↩️  Model {model_name} rolled back to {target}")
+        return Path(target).stem
+    
+    def _prune(self, model_name: str):
+        """Delete versions beyond the current one and the keep_versions newest others"""
+        current = self.current_version(model_name)
+        others = [v['file'] for v in self.versions(model_name) if v['file'] != current]
+        model_dir = self.models_dir / model_name
+        
+        for version_file in others[:max(len(others) - self.keep_versions, 0)]:
+            path = model_dir / version_file
+            self._evict_path(path)
+            try:
+                path.unlink()
+            except OSError:
+                # Still mapped by a reader on platforms that lock open files
+                pass
+    
+    def _cached_load(self, model_name: str, model_path: Path,
+                     read: Callable[[Path], Optional[Any]]) -> Optional[Any]:
+        """Cached model for the file's current version, reading it at most once at a time"""
+        while True:
+            try:
+                stat = model_path.stat()
+            except FileNotFoundError:
+                return None
+            version = (stat.st_mtime_ns, stat.st_size)
+            
+            with self._lock:
+                entry = self._cache.get(model_path)
+                if entry is not None and entry.version == version:
+                    entry.hits += 1
+                    self.hits += 1
+                    return entry.value
+                pending = self._loading.get(model_path)
+                if pending is None:
+                    pending = self._loading[model_path] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is reading this file; use its result once done
+            pending.wait()
+        
+        try:
+            value = read(model_path)
+            if value is not None:
+                # Sized outside the lock: estimate_size walks the whole model
+                entry = _CachedModel(value, version, model_path, model_name)
+                with self._lock:
+                    self._cache[model_path] = entry
+                    self._evict_other_versions(model_name, model_path)
+            return value
+        finally:
+            with self._lock:
+                del self._loading[model_path]
+            pending.set()
+    
+    def loaded_models(self) -> List[Dict[str, Any]]:
+        """Models currently held in memory"""
+        with self._lock:
+            entries = list(self._cache.values())
+        return [
+            {
+                "model": entry.name,
+                "file": entry.path.name,
+                "file_bytes": entry.version[1],
+                "memory_bytes": entry.memory_bytes,
+                "mapped_bytes": entry.mapped_bytes,
+                "loaded_at": entry.loaded_at,
+                "hits": entry.hits
+            }
+            for entry in entries
+        ]
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Registry summary: loaded models, their total memory and hit/miss counts"""
+        models = self.loaded_models()
+        return {
+            "n_loaded": len(models),
+            "memory_bytes": sum(m['memory_bytes'] for m in models),
+            "mapped_bytes": sum(m['mapped_bytes'] for m in models),
+            "mmap": self.mmap,
+            "hits": self.hits,
+            "misses": self.misses,
+            "models": models
+        }
+    
+    def evict(self, model_name: Optional[str] = None) -> int:
+        """Drop a model (all models if model_name is None) from memory; returns how many"""
+        with self._lock:
+            paths = [
+                path for path, entry in self._cache.items()
+                if model_name is None or entry.name == model_name
+            ]
+            for path in paths:
+                del self._cache[path]
+        return len(paths)
+    
+    def _evict_other_versions(self, model_name: str, model_path: Path):
+        """Drop the model's cached versions other than model_path (caller holds _lock)"""
+        for path in [path for path, entry in self._cache.items()
+                     if entry.name == model_name and path != model_path]:
+            del self._cache[path]
+    
+    def _evict_path(self, model_path: Path):
+        with self._lock:
+            self._cache.pop(model_path, None)
+    
     def model_exists(self, model_name: str) -> bool:
         """Check if model exists"""
-        model_path = self.models_dir / f"{model_name}.pkl"
-        return model_path.exists()
+        return self.current_version(model_name) is not None or any(
+            (self.models_dir / f"{model_name}{ext}").exists() for ext in MODEL_EXTENSIONS
+        )
     
     def list_models(self) -> list:
         """List all saved models"""
-        return [f.stem for f in self.models_dir.glob("*.pkl")]
+        versioned = {p.parent.name for p in self.models_dir.glob(f"*/{CURRENT_POINTER}")}
+        return sorted(versioned | {
+            f.stem for ext in MODEL_EXTENSIONS for f in self.models_dir.glob(f"*{ext}")
+        })
     
     def delete_model(self, model_name: str) -> bool:
-        """Delete model file"""
-        model_path = self.models_dir / f"{model_name}.pkl"
-        
-        if model_path.exists():
-            model_path.unlink()
-            print(f"🗑️  Model deleted: {model_path}")
-            return True
-        return False
+        """Delete every version of a model"""
+        deleted = False
+        self.evict(model_name)
+        
+        model_dir = self.models_dir / model_name
+        if model_dir.is_dir():
+            shutil.rmtree(model_dir)
+            self._pointers.pop(model_dir / CURRENT_POINTER, None)
+            print(f"🗑️  Model deleted: {model_dir}")
+            deleted = True
+        
+        for ext in MODEL_EXTENSIONS:
+            model_path = self.models_dir / f"{model_name}{ext}"
+            if model_path.exists():
+                model_path.unlink()
+                print(f"🗑️  Model deleted: {model_path}")
+                deleted = True
+        return deleted
 
 # Singleton instance
-model_loader = ModelLoader()
+model_loader = ModelLoader(
+    mmap=os.getenv("MODEL_MMAP", "0") == "1",
+    keep_versions=int(os.getenv("MODEL_KEEP_VERSIONS", 3))
+)
 
 # Predefined model names
 MODEL_KMEANS = "product_clustering_kmeans" # Changed from customer_segmentation_kmeans
@@ -0,0 +1,284 @@
+"""
+Local Arrow snapshots of the training extracts
+"""
+
+import importlib.util
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable
+
+import numpy as np
+import pandas as pd
+
+from utils.database import db, Database
+
+# Extract name -> watermark column. Extracts with a watermark only fetch rows
+# above it on refresh; the others (aggregates, active products) are
+# re-extracted whole.
+EXTRACTS: Dict[str, Optional[str]] = {
+    "orders": "id",
+    "transactions": "order_id",
+    "customers": None,
+    "products": None,
+    "order_features": None,
+    "daily_revenue": None,
+    "customer_rfm": None,
+}
+
+# Extracts whose database helper filters since_date in SQL -> the date
+# column that filter applies to (other extracts filter created_at)
+DATE_FILTERED_EXTRACTS: Dict[str, str] = {
+    "transactions": "created_at",
+    "daily_revenue": "day",
+}
+
+def _pyarrow_available() -> bool:
+    """Whether pyarrow is installed, without importing it (it is loaded on the first snapshot read)"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+def _pyarrow():
+    """pyarrow is optional; without it every read goes to the database"""
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.ipc  # noqa: F401
+        return pyarrow
+    except ImportError:
+        return None
+
+class SnapshotStore:
+    """
+    Arrow IPC snapshot per extract, refreshed by watermark and read memory-mapped
+
+    A snapshot is refreshed when it is older than `refresh_interval` seconds:
+    watermark extracts append the rows above their watermark, the others are
+    re-extracted. Watermark extracts are also rebuilt after
+    `full_refresh_interval` seconds, which picks up orders delivered after a
+    newer order was already snapshotted. If the database is unreachable an
+    existing snapshot is served as is, so snapshots also work offline.
+    """
+
+    def __init__(self, database: Database, snapshot_dir: Optional[str] = None,
+                 refresh_interval: float = 300, full_refresh_interval: float = 86400,
+                 enabled: bool = True):
+        if snapshot_dir is None:
+            # Default to data/snapshots in project root
+            snapshot_dir = Path(__file__).parent.parent.parent / "data" / "snapshots"
+
+        self.db = database
+        self.snapshot_dir = Path(snapshot_dir)
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self.enabled = enabled and _pyarrow_available()
+        self._lock = threading.Lock()
+        self._fetchers: Dict[str, Callable[..., Any]] = {
+            "orders": lambda since, since_date=None: database.get_orders_columns(since_order_id=since),
+            "transactions": lambda since, since_date=None: database.get_transactions_columns(
+                since_order_id=since, since_date=since_date
+            ),
+            "customers": lambda since, since_date=None: database.get_customers_columns(),
+            "products": lambda since, since_date=None: database.get_products_columns(),
+            "order_features": lambda since, since_date=None: database.get_order_features_columns(),
+            "daily_revenue": lambda since, since_date=None: database.get_daily_revenue_columns(since_date=since_date),
+            "customer_rfm": lambda since, since_date=None: database.get_customer_rfm_columns(),
+        }
+
+    def frame(self, name: str, since_id: Optional[int] = None,
+              since_date: Optional[datetime] = None, refresh: bool = True,
+              current: bool = False) -> pd.DataFrame:
+        """
+        Extract as a DataFrame, served from the snapshot when snapshots are enabled
+
+        since_id / since_date keep only rows above the watermark column /
+        created_at, like the since_* filters of the database helpers. Without
+        snapshots both are passed to the database helper where it supports
+        them, so only the new rows are extracted.
+
+        Serving reads accept a snapshot up to refresh_interval old. Training
+        passes current=True: the snapshot is then refreshed whatever its
+        age, and rebuilt in full unless since_id asks for the rows above a
+        watermark only, so orders delivered after a newer order was
+        snapshotted are included too.
+        """
+        if not self.enabled:
+            df = self._fetchers[name](
+                since_id if EXTRACTS[name] is not None else None,
+                since_date if name in DATE_FILTERED_EXTRACTS else None
+            ).to_frame()
+        else:
+            if current:
+                self.refresh(name, full=since_id is None, force=True)
+            elif refresh:
+                self.refresh(name)
+            df = self.read(name)
+
+        if df.empty:
+            return df
+        if since_id is not None:
+            df = df[df[EXTRACTS[name]].to_numpy() > since_id]
+        if since_date is not None:
+            date_column = DATE_FILTERED_EXTRACTS.get(name, 'created_at')
+            df = df[pd.to_datetime(df[date_column]).to_numpy() >= np.datetime64(since_date)]
+        return df.reset_index(drop=True)
+
+    async def frame_async(self, name: str, **kwargs) -> pd.DataFrame:
+        """frame() on the database executor, for async handlers"""
+        return await self.db.run_async(self.frame, name, **kwargs)
+
+    def read(self, name: str) -> pd.DataFrame:
+        """Snapshot as a DataFrame, read through a memory map (empty if missing)"""
+        pa = _pyarrow()
+        path = self._path(name)
+        if not path.exists():
+            return pd.DataFrame()
+
+        with pa.memory_map(str(path), 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas()
+
+    def refresh(self, name: str, full: bool = False, force: bool = False) -> Dict[str, Any]:
+        """Bring a snapshot up to date when it is stale (or always with full=True / force=True)"""
+        with self._lock:
+            meta = self._read_meta(name)
+            now = time.time()
+            key = EXTRACTS[name]
+            exists = self._path(name).exists()
+
+            if not (full or force) and exists and now - meta.get("refreshed_at", 0) <= self.refresh_interval:
+                return {"snapshot": name, "refreshed": False, "n_rows": meta.get("n_rows", 0)}
+
+            full = (
+                full or not exists or key is None
+                or now - meta.get("full_refreshed_at", 0) > self.full_refresh_interval
+            )
+
+            try:
+                if full:
+                    result = self._full_refresh(name, key, now)
+                else:
+                    result = self._incremental_refresh(name, key, meta, now)
+            except Exception as e:
+                if not exists:
+                    raise
+                print(f"⚠️  Snapshot {name} not refreshed, serving existing snapshot: {e}")
+                return {"snapshot": name, "refreshed": False, "n_rows": meta.get("n_rows", 0)}
+
+            return result
+
+    def status(self) -> Dict[str, Any]:
+        """Watermark, age and size of every snapshot"""
+        now = time.time()
+        result = {}
+        for name in EXTRACTS:
+            meta = self._read_meta(name)
+            result[name] = {
+                "exists": self._path(name).exists(),
+                "n_rows": meta.get("n_rows", 0),
+                "watermark": meta.get("watermark"),
+                "age_s": round(now - meta["refreshed_at"], 1) if "refreshed_at" in meta else None
+            }
+        return result
+
+    def _full_refresh(self, name: str, key: Optional[str], now: float) -> Dict[str, Any]:
+        table = self._to_table(self._fetchers[name](None).to_frame())
+        self._write(name, table)
+        meta = {
+            "n_rows": table.num_rows,
+            "watermark": self._max_key(table, key),
+            "refreshed_at": now,
+            "full_refreshed_at": now
+        }
+        self._write_meta(name, meta)
+        return {"snapshot": name, "refreshed": True, "full": True, "n_rows": table.num_rows, "n_new_rows": table.num_rows}
+
+    def _incremental_refresh(self, name: str, key: str, meta: Dict[str, Any], now: float) -> Dict[str, Any]:
+        pa = _pyarrow()
+        watermark = meta.get("watermark")
+        new_frame = self._fetchers[name](watermark).to_frame()
+
+        if len(new_frame) > 0:
+            with pa.memory_map(str(self._path(name)), 'r') as source:
+                existing = pa.ipc.open_file(source).read_all()
+            try:
+                new_rows = self._to_table(new_frame).cast(existing.schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                # Column types drifted (e.g. an all-NULL batch); rebuild instead
+                return self._full_refresh(name, key, now)
+            table = pa.concat_tables([existing, new_rows]).unify_dictionaries()
+            self._write(name, table)
+            meta["n_rows"] = table.num_rows
+            meta["watermark"] = self._max_key(table, key)
+
+        meta["refreshed_at"] = now
+        self._write_meta(name, meta)
+        return {"snapshot": name, "refreshed": True, "full": False, "n_rows": meta["n_rows"], "n_new_rows": len(new_frame)}
+
+    def _to_table(self, df: pd.DataFrame):
+        """Arrow table with dictionary columns normalized to int32 indices"""
+        pa = _pyarrow()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        fields = [
+            pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type))
+            if pa.types.is_dictionary(f.type) else f
+            for f in table.schema
+        ]
+        return table.cast(pa.schema(fields))
+
+    def _max_key(self, table, key: Optional[str]) -> Optional[int]:
+        if key is None or table.num_rows == 0:
+            return None
+        return int(_pyarrow().compute.max(table[key]).as_py())
+
+    def _write(self, name: str, table):
+        """Write uncompressed (so it can be memory-mapped) and swap in atomically"""
+        pa = _pyarrow()
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._tmp_path(self._path(name))
+        try:
+            with pa.OSFile(str(tmp_path), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, self._path(name))
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _tmp_path(self, path: Path) -> Path:
+        """Temp file next to `path`, unique per process and thread so concurrent writers never share one"""
+        return path.parent / f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _path(self, name: str) -> Path:
+        return self.snapshot_dir / f"{name}.arrow"
+
+    def _meta_path(self, name: str) -> Path:
+        return self.snapshot_dir / f"{name}.json"
+
+    def _read_meta(self, name: str) -> Dict[str, Any]:
+        path = self._meta_path(name)
+        if not path.exists():
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self, name: str, meta: Dict[str, Any]):
+        tmp_path = self._tmp_path(self._meta_path(name))
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self._meta_path(name))
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+# Singleton instance
+snapshots = SnapshotStore(
+    db,
+    snapshot_dir=os.getenv("DB_SNAPSHOT_DIR"),
+    refresh_interval=float(os.getenv("DB_SNAPSHOT_REFRESH_INTERVAL", 300)),
+    full_refresh_interval=float(os.getenv("DB_SNAPSHOT_FULL_REFRESH_INTERVAL", 86400)),
+    enabled=os.getenv("DB_SNAPSHOT_ENABLED", "1") == "1"
+)
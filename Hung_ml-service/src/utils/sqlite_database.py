@@ -0,0 +1,186 @@
+"""
+SQLite stand-in for the SQL Server database (local runs, tests and benchmarks)
+"""
+
+import sqlite3
+from datetime import date, datetime
+from typing import Any, List, Optional
+
+import pandas as pd
+
+from utils.database import Database
+from utils.columnar import ColumnarResult
+
+# Columns SQLite returns as text that should come back as datetime64
+DATE_COLUMNS = ("created_at", "day")
+
+# Tables and columns used by the Database queries and the prediction write-back
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Users (
+    id INTEGER PRIMARY KEY,
+    role TEXT NOT NULL DEFAULT 'customer'
+);
+CREATE TABLE IF NOT EXISTS Categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS Products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    price REAL NOT NULL,
+    discount_percent INTEGER DEFAULT 0,
+    stock INTEGER NOT NULL DEFAULT 0,
+    category_id INTEGER REFERENCES Categories(id),
+    images TEXT,
+    unit TEXT,
+    status TEXT NOT NULL DEFAULT 'active'
+);
+CREATE TABLE IF NOT EXISTS Orders (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES Users(id),
+    total REAL NOT NULL,
+    subtotal REAL,
+    discount REAL,
+    shipping_fee REAL,
+    payment_method TEXT,
+    order_status TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS OrderItems (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES Orders(id),
+    product_id INTEGER NOT NULL REFERENCES Products(id),
+    quantity INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS CustomerSegments (
+    user_id INTEGER PRIMARY KEY,
+    segment TEXT NOT NULL,
+    rfm_score INTEGER NOT NULL,
+    recency INTEGER NOT NULL,
+    frequency INTEGER NOT NULL,
+    monetary REAL NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ProductClusters (
+    product_id INTEGER PRIMARY KEY,
+    cluster INTEGER NOT NULL,
+    cluster_label TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ProductRecommendations (
+    product_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    recommended_product_id INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    lift REAL NOT NULL,
+    support REAL NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (product_id, rank)
+);
+CREATE INDEX IF NOT EXISTS ix_orders_created_at ON Orders(created_at);
+CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON OrderItems(order_id);
+"""
+
+def _adapt(value: Any) -> Any:
+    """Store datetimes as the ISO text SQLite compares and sorts correctly"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+class _SQLiteCursor:
+    """pymssql-style cursor: %s placeholders, optional dict rows"""
+
+    def __init__(self, cursor: sqlite3.Cursor, as_dict: bool):
+        self._cursor = cursor
+        self.as_dict = as_dict
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def execute(self, query: str, params: tuple = ()):
+        self._cursor.execute(query.replace("%s", "?"), tuple(_adapt(v) for v in params))
+
+    def executemany(self, query: str, seq_of_params):
+        self._cursor.executemany(
+            query.replace("%s", "?"),
+            (tuple(_adapt(v) for v in params) for params in seq_of_params)
+        )
+
+    def _rows(self, rows: List[tuple]) -> List[Any]:
+        if not self.as_dict:
+            return rows
+        names = [column[0] for column in self._cursor.description]
+        return [dict(zip(names, row)) for row in rows]
+
+    def fetchall(self) -> List[Any]:
+        return self._rows(self._cursor.fetchall())
+
+    def fetchmany(self, size: int) -> List[Any]:
+        return self._rows(self._cursor.fetchmany(size))
+
+class _SQLiteConnection:
+    """pymssql-style connection (dict rows by default)"""
+
+    def __init__(self, path: str):
+        # Pooled connections move between threads, one user at a time
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, as_dict: bool = True) -> _SQLiteCursor:
+        return _SQLiteCursor(self._conn.cursor(), as_dict)
+
+    def executescript(self, script: str):
+        self._conn.executescript(script)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+class SQLiteDatabase(Database):
+    """Same interface and queries as Database, on a local SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        super().__init__()
+
+    def _connect(self):
+        return _SQLiteConnection(self.path)
+
+    def create_schema(self):
+        """Create the tables the queries read (no-op for existing tables)"""
+        with self.get_connection() as conn:
+            conn.executescript(SCHEMA)
+            conn.commit()
+
+    def query_columns(self, query: str, params: Optional[tuple] = None, *args, **kwargs) -> ColumnarResult:
+        result = super().query_columns(query, params, *args, **kwargs)
+        for name in DATE_COLUMNS:
+            if name in result.columns and result.columns[name].dtype == object:
+                result.columns[name] = pd.to_datetime(result.columns[name]).to_numpy()
+        return result
+
+    # SQL dialect hooks
+    def _sql_days_since(self, expr: str) -> str:
+        return f"CAST(julianday(date('now', 'localtime')) - julianday(date({expr})) AS INTEGER)"
+
+    def _sql_datepart(self, part: str, expr: str) -> str:
+        if part == "weekday":
+            # SQL Server default: Sunday = 1 ... Saturday = 7
+            return f"(CAST(strftime('%w', {expr}) AS INTEGER) + 1)"
+        fmt = {"year": "%Y", "month": "%m", "day": "%d"}[part]
+        return f"CAST(strftime('{fmt}', {expr}) AS INTEGER)"
+
+    def _sql_date(self, expr: str) -> str:
+        return f"date({expr})"
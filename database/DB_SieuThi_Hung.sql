@@ -10,6 +10,9 @@ GO
 USE DB_SieuThi_Nghi;
 GO
 
+IF OBJECT_ID('dbo.ProductRecommendations', 'U') IS NOT NULL DROP TABLE dbo.ProductRecommendations;
+IF OBJECT_ID('dbo.ProductClusters', 'U') IS NOT NULL DROP TABLE dbo.ProductClusters;
+IF OBJECT_ID('dbo.CustomerSegments', 'U') IS NOT NULL DROP TABLE dbo.CustomerSegments;
 IF OBJECT_ID('dbo.OrderItems', 'U') IS NOT NULL DROP TABLE dbo.OrderItems;
 IF OBJECT_ID('dbo.Payments', 'U') IS NOT NULL DROP TABLE dbo.Payments;
 IF OBJECT_ID('dbo.Orders', 'U') IS NOT NULL DROP TABLE dbo.Orders;
@@ -138,6 +141,37 @@ CREATE TABLE dbo.Themes (
     is_active BIT DEFAULT 0
 );
 
+-- Model predictions written back by the ML service (training/writeback_predictions.py)
+CREATE TABLE dbo.CustomerSegments (
+    user_id INT PRIMARY KEY FOREIGN KEY REFERENCES dbo.Users(id) ON DELETE CASCADE,
+    segment NVARCHAR(50) NOT NULL,
+    rfm_score INT NOT NULL,
+    recency INT NOT NULL,
+    frequency INT NOT NULL,
+    monetary DECIMAL(18,2) NOT NULL,
+    updated_at DATETIME NOT NULL DEFAULT GETDATE()
+);
+CREATE INDEX IX_CustomerSegments_segment ON dbo.CustomerSegments(segment);
+
+CREATE TABLE dbo.ProductClusters (
+    product_id INT PRIMARY KEY FOREIGN KEY REFERENCES dbo.Products(id) ON DELETE CASCADE,
+    cluster INT NOT NULL,
+    cluster_label NVARCHAR(100),
+    updated_at DATETIME NOT NULL DEFAULT GETDATE()
+);
+CREATE INDEX IX_ProductClusters_cluster ON dbo.ProductClusters(cluster);
+
+CREATE TABLE dbo.ProductRecommendations (
+    product_id INT NOT NULL FOREIGN KEY REFERENCES dbo.Products(id) ON DELETE CASCADE,
+    rank INT NOT NULL,
+    recommended_product_id INT NOT NULL FOREIGN KEY REFERENCES dbo.Products(id),
+    confidence FLOAT NOT NULL,
+    lift FLOAT NOT NULL,
+    support FLOAT NOT NULL,
+    updated_at DATETIME NOT NULL DEFAULT GETDATE(),
+    PRIMARY KEY (product_id, rank)
+);
+
 GO
 CREATE TRIGGER trg_UpdateUsers ON dbo.Users AFTER UPDATE AS BEGIN UPDATE dbo.Users SET updated_at = GETDATE() FROM dbo.Users u INNER JOIN inserted i ON u.id = i.id; END;
 GO